@@ -0,0 +1,106 @@
+"""
+Compare the memory and time of expanding elements as per-element dicts with the shared-defaults
+ExpandedElement records in check-elements.py, on a document scaled up from a Data3 example
+"""
+import copy
+import importlib
+import jadn
+import os
+import time
+import tracemalloc
+from urllib.parse import urlparse
+
+from schema_cache import SchemaCache
+
+ce = importlib.import_module('check-elements')
+
+SOURCE = os.path.join(ce.DATA_DIR, 'package-rev2-define.json')
+N_ELEMENTS = 100000
+
+
+def expand_iri_copy(context: dict, element_id: str) -> str:
+    """
+    Reference: previous version of expand_iri, which builds a new string for each IRI
+    """
+    u = urlparse(element_id)
+    if u.scheme:
+        if prefix := context['prefixes'].get(u.scheme, ''):
+            context['index'].check(element_id)
+            return prefix + u.path
+        return element_id
+    context['index'].check(element_id)
+    return context.get('namespace', '') + element_id
+
+
+def expand_element_copy(context: dict, element: dict) -> dict:
+    """
+    Reference: previous version of expand_element, which copies the context defaults into each element
+    """
+    element_x = {'id': ''}
+    element_x.update({k: context[k] for k in ce.DEFAULT_PROPERTIES if k in context})
+    element_x.update(element)
+    context['plan'].rewrite(element_x, lambda iri: expand_iri_copy(context, iri))
+    return element_x
+
+
+def compress_element_copy(context: dict, element_x: dict) -> dict:
+    element = {k: v for k, v in element_x.items() if v != context.get(k, '')}
+    ce.compress_ids(context, element)
+    return element
+
+
+def scaled_document(codec: jadn.codec.Codec, schema: dict, plan: ce.IriPlan, n: int) -> dict:
+    """
+    Return a decoded document with n elements, copies of the source elements with a suffix on each local id
+
+    Elements are decoded one at a time, as by check-elements --stream, because n exceeds $MaxElements.
+    """
+    source = ce.json.load(open(SOURCE))
+    elements = []
+    for c in range(-(-n // len(source['elements']))):
+        for element in copy.deepcopy(source['elements']):
+            if c:
+                plan.rewrite(element, lambda iri: iri if ':' in iri else f'{iri}-{c}')
+            elements.append(element)
+    props = ce.decode_properties(codec, schema, ce.DOCUMENT_TYPE, {k: v for k, v in source.items() if k != 'elements'},
+                                 ce.STREAMED)
+    return {**props, 'elements': [codec.decode(ce.ELEMENT_TYPE, e) for e in elements[:n]]}
+
+
+def bench(codec: jadn.codec.Codec, schema: dict, plan: ce.IriPlan, expand: callable, trace: bool) -> tuple:
+    """
+    Return (context, expanded elements, bytes retained per element or seconds) of expanding a scaled document
+
+    Memory and time are measured in separate runs, because tracing allocations slows expansion down.
+    """
+    doc = scaled_document(codec, schema, plan, N_ELEMENTS)
+    if trace:
+        tracemalloc.start()
+    before, start = tracemalloc.get_traced_memory()[0], time.perf_counter()
+    ctx = ce.validate_document(doc, plan)
+    x_elements = [expand(ctx, e) for e in doc['elements']]
+    sec = time.perf_counter() - start
+    del doc                     # Keep only what the expanded elements reference
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return ctx, x_elements, retained / len(x_elements) if trace else sec
+
+
+if __name__ == '__main__':
+    cache = SchemaCache()
+    s = cache.load(ce.SCHEMA, ce.load_any)['schema']
+    sc = jadn.codec.Codec(s, verbose_rec=True, verbose_str=True)
+    plan = ce.IriPlan.from_tree(cache.derived(ce.SCHEMA, 'IriPlan', lambda schema: ce.IriPlan(schema).root))
+    print(f'{N_ELEMENTS} elements scaled from {SOURCE}')
+
+    results = {}
+    for name, expand in (('dict copies', expand_element_copy), ('ExpandedElement', ce.expand_element)):
+        ctx, x_elements, size = bench(sc, s, plan, expand, trace=True)
+        sec = bench(sc, s, plan, expand, trace=False)[2]
+        results[name] = ctx, x_elements, size, sec
+        print(f'{name:>16}: {size:6.0f} bytes/element, {sec:.3f} sec, {N_ELEMENTS / sec:,.0f} elements/sec')
+    (old_ctx, old, old_size, t_old), (new_ctx, new, new_size, t_new) = results.values()
+    same = all(ce.canonical_element(a) == ce.canonical_element(b) for a, b in zip(old, new))
+    same &= all(compress_element_copy(old_ctx, a) == ce.compress_element(new_ctx, b) for a, b in zip(old, new))
+    print(f'Memory: {old_size / new_size:.2f}x less, speedup: {t_old / t_new:.2f}x, '
+          f'canonical and compressed elements identical: {same}')
@@ -0,0 +1,112 @@
+"""
+Compare the regex cascade template scanner with the single-pass scanner in template2model.py
+on a synthetic corpus of template files
+"""
+import os
+import random
+import re
+import time
+from collections import defaultdict
+from contextlib import redirect_stdout
+from io import StringIO
+
+os.environ.setdefault('GitHubToken', '')        # Not used for scanning, but required by template2model
+from template2model import CATEGORY_METADATA, scan_template_file
+
+N_TEMPLATES = 10000
+SEED = 1
+
+
+def scan_template_file_regex(fpath: str, file: str, category: str, fname: str) -> dict:
+    """
+    Reference scanner: previous version of scan_template_file using a cascade of uncompiled regexes
+    """
+    tval = defaultdict(dict)
+    tval['Metadata']['name'] = fname
+    section = ''
+    for ln, line in enumerate(file.splitlines(), start=1):
+        if len(line):
+            if m := re.match(r'^#\s+(.+)\s*$', line):
+                if fname != m.group(1):
+                    print(f'    {fpath} line {ln} -- File name does not match heading {m.group(1)}')
+            elif m := re.match(r'^##\s+(.+)\s*$', line):
+                section = m.group(1)
+                li1, li2 = '', ''
+                if section not in ('Summary', 'Description', 'Metadata', 'Properties', 'Entries'):
+                    print(f'    {fpath} line {ln} -- Unknown section: "{section}"')
+            elif m := re.match(r'^[-*]\s+(.+)\s*$', line):
+                li1 = m.group(1)
+                if section in ('Metadata', 'Entries'):
+                    k, v = li1.split(':', maxsplit=1)
+                    tval[section].update({k.strip(): v.strip()})
+                elif section == 'Properties':
+                    pdefault = {'minCount': 0, 'maxCount': '*'} if category == 'Classes' else {}
+                    tval[section].update({li1: pdefault})
+            elif m := re.match(r'^\s+[-*]\s+(.+)\s*$', line):
+                li2 = m.group(1)
+                if section == 'Properties':
+                    if ':' in li2:
+                        k, v = li2.split(':', maxsplit=1)
+                        tval[section][li1].update({k.strip(): v.strip()})
+                    else:
+                        print(f'    {fpath} line {ln} {section}/{li1} -- bad data: "{li2}"')
+            elif line.startswith('SPDX-License-Identifier:'):
+                pass
+            elif section not in ('Description', 'Summary'):
+                print(f'    {fpath} line {ln} -- Unrecognized data: "{line}"')
+    missing = {CATEGORY_METADATA: set(('Metadata',)),
+               'Classes': set(('Metadata', 'Properties')),
+               'Properties': set(('Metadata',)),
+               'Vocabularies': set(('Metadata', 'Entries'))}[category] - set(tval)
+    if missing:
+        print(f'    {fpath} -- Missing required section: {missing}')
+    return dict(tval)
+
+
+def make_template(rnd: random.Random, n: int) -> tuple:
+    """
+    Return (category, name, content) of a synthetic template, including some malformed lines
+    """
+    category = rnd.choice(('Classes', 'Properties', 'Vocabularies'))
+    name = f'Type{n}'
+    lines = ['SPDX-License-Identifier: Community-Spec-1.0', '',
+             f'# {name if rnd.random() > 0.02 else name + "x"}', '',
+             '## Summary', '', f'Summary of {name}.', '',
+             '## Description', '']
+    lines += [f'Line {k} of a description with some *markdown* text.  ' for k in range(rnd.randint(2, 12))]
+    lines += ['', '## Metadata', '', f'- name: {name}', '- SubclassOf: Element', '- Instantiability: Concrete']
+    if category == 'Classes':
+        lines += ['', '## Properties', '']
+        for p in range(rnd.randint(1, 8)):
+            bullet = rnd.choice('-*')
+            lines += [f'{bullet} prop{p}', f'  {bullet} type: xsd:string', '  - minCount: 0', '  - maxCount: 1 ']
+            if rnd.random() < 0.05:
+                lines.append('  - malformed entry')
+    elif category == 'Vocabularies':
+        lines += ['', '## Entries', '']
+        lines += [f'- VALUE_{v}: description of value {v}' for v in range(rnd.randint(2, 20))]
+    if rnd.random() < 0.03:
+        lines += ['', '## External properties restrictions', '', 'unrecognized text']
+    return category, name, '\n'.join(lines) + '\n'
+
+
+def bench(scan: callable, corpus: list) -> tuple:
+    start = time.perf_counter()
+    results = [scan(f'/{c}/{n}.md', doc, c, n) for c, n, doc in corpus]
+    return results, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    rnd = random.Random(SEED)
+    corpus = [make_template(rnd, n) for n in range(N_TEMPLATES)]
+    print(f'{len(corpus)} templates, {sum(len(doc) for *_, doc in corpus):,} bytes')
+
+    with redirect_stdout(log := StringIO()):
+        old, t_old = bench(scan_template_file_regex, corpus)
+    print(f'{"regex":>12}: {t_old:.3f} sec, {len(corpus) / t_old:,.0f} templates/sec, '
+          f'{len(log.getvalue().splitlines())} warnings printed')
+    diagnostics = []
+    new, t_new = bench(lambda *a: scan_template_file(*a, diagnostics=diagnostics), corpus)
+    print(f'{"single-pass":>12}: {t_new:.3f} sec, {len(corpus) / t_new:,.0f} templates/sec, '
+          f'{len(diagnostics)} diagnostics collected')
+    print(f'Speedup: {t_old / t_new:.2f}x, results identical: {old == new}')
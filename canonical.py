@@ -0,0 +1,23 @@
+"""
+Canonical JSON of expanded elements, the bytes hashed by check-elements --hash and stored by element_store
+"""
+import json
+from collections.abc import Mapping
+
+
+def _canonical_default(value):
+    return dict(value) if isinstance(value, Mapping) else bytes.hex(value)
+
+
+canonical_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'), ensure_ascii=False,
+                                     default=_canonical_default)
+
+
+def canonical_element(element_x: Mapping) -> bytes:
+    """
+    Serialize an expanded element as canonical JSON: sorted keys, no whitespace, UTF-8
+
+    All Binary types in the information model have the /x (hex) format, so this is the verbose JSON
+    encoding of the element with sorted keys, produced without a Python-level pass over the element.
+    """
+    return canonical_encoder.encode(element_x).encode()
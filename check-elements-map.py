@@ -4,84 +4,32 @@ Expand documents containing element+context into multiple individual elements
 import jadn
 import json
 import os
-from urllib.parse import urlparse
+from element_iri import DocumentIndex, IriPlan, PrefixMatcher, expand_iri, prefix_matcher
+from schema_cache import SchemaCache
 
 SCHEMA = 'Schemas/spdx-v3-map.jidl'
 DATA_DIR = 'Data3/ElementMap'
 OUT_DIR = 'Out'
 DEFAULT_PROPERTIES = ('specVersion', 'created', 'profile', 'dataLicense')
-IRI_LOCATIONS = ('id', 'created/by', '*/elements/*', 'relationship/from', 'relationship/to/*',
-                 '*/originator', 'elementRefs/id', 'annotation/subject')
 
 
-def expand_iri(context: dict, element_id: str) -> str:
+def expand_ids(context: dict, element: dict) -> None:
     """
-    Convert an Element ID in namespace:local form to an IRI
+    Convert all IRIs in an element from namespace:local form to absolute IRI, at locations given by context plan
     """
-    if context:
-        u = urlparse(element_id)
-        if u.scheme:
-            if prefix := context['prefixes'].get(u.scheme, ''):
-                return prefix + u.path
-            return element_id
-        if element_id not in context.get('doc_ids', []):
-            print(f'    Undefined Element: {element_id}')
-        return context.get('namespace', '') + element_id
-    return element_id
-
-
-def compress_iri(context: dict, iri: str) -> str:
-    """
-    Convert an Element ID IRI to namespace:local form
-    """
-    if context:
-        if base := context.get('namespace', ''):
-            if iri.startswith(base):
-                return iri.replace(base, '')
-        for k, v in context.get('prefixes', {}).items():
-            if iri.startswith(v):
-                return iri.replace(v, k + ':')
-    return iri
-
-
-def expand_ids(context: dict, element: dict, paths: list) -> None:
-    """
-    Convert all IRIs in an element from namespace:local form to absolute IRI
-
-    Hardcode IRI locations for now; replace with path-driven update
-    """
-    element.update({'id': expand_iri(context, element['id'])})
-    if 'created' in element:
-        element['created']['by'] = [expand_iri(context, k) for k in element['created']['by']]
-    for etype, eprops in element['type'].items():
-        for p in eprops:
-            if p in ('elements', 'rootElements', 'originator', 'members'):
-                eprops[p] = [expand_iri(context, k) for k in eprops[p]]
-        if etype == 'annotation':
-            eprops['subject'] = expand_iri(context, eprops['subject'])
-        elif etype == 'relationship':
-            eprops['from'] = expand_iri(context, eprops['from'])
-            eprops['to'] = [expand_iri(context, k) for k in eprops['to']]
+    element.update({'id': expand_iri(context, element['id'])})     # id is the Elements map key, not a field
+    context['plan'].rewrite(element, lambda iri: expand_iri(context, iri))
 
 
 def compress_ids(context: dict, element: dict) -> None:
     """
-    Convert all IRIs in an element from absolute IRI to namespace:local form
-
-    Hardcode IRI locations for now; replace with path-driven update
+    Convert all IRIs in an element from absolute IRI to namespace:local form, at locations given by context plan
     """
-    element.update({'id': compress_iri(context, element['id'])})
-    if 'created' in element:
-        element['created']['by'] = [compress_iri(context, k) for k in element['created']['by']]
-    for etype, eprops in element['type'].items():
-        for p in eprops:
-            if p in ('elements', 'rootElements', 'originator', 'members'):
-                eprops[p] = [compress_iri(context, k) for k in eprops[p]]
-        if etype == 'annotation':
-            eprops['subject'] = compress_iri(context, eprops['subject'])
-        elif etype == 'relationship':
-            eprops['from'] = compress_iri(context, eprops['from'])
-            eprops['to'] = [compress_iri(context, k) for k in eprops['to']]
+    if not context:
+        return
+    compress = prefix_matcher(context).compress
+    element.update({'id': compress(element['id'])})
+    context['plan'].rewrite(element, compress)
 
 
 def expand_element(context: dict, element: dict) -> dict:
@@ -91,7 +39,7 @@ def expand_element(context: dict, element: dict) -> dict:
     element_x = {'id': ''}      # put id first
     element_x.update({k: context[k] for k in DEFAULT_PROPERTIES if k in context})
     element_x.update(element)
-    expand_ids(context, element_x, IRI_LOCATIONS)
+    expand_ids(context, element_x)
     return element_x
 
 
@@ -122,26 +70,33 @@ def dump_elements(context: dict, elements: list[dict]) -> None:
         print(compress_element(context, e))
 
 
-def validate_document(document: dict) -> dict:
+def validate_document(document: dict, plan: IriPlan) -> dict:
     cx = {k: document[k] for k in document if k not in ('elements', 'documentRefs', 'namespaceMap')}
-    cx['doc_ids'] = [compress_iri(cx, eid) for eid, e in document['elements'].items()]
-    cx['ref_ids'] = [ref['namespace'] + ':' + e for ref in document.get('documentRefs', []) for e in ref['elements']]
+    cx['plan'] = plan
     cx['prefixes'] = {prefix: uri for uri, prefix in document.get('namespaceMap', {}).items()}
+    cx['matcher'] = PrefixMatcher(cx.get('namespace', ''), cx['prefixes'])
+    cx['index'] = index = DocumentIndex(cx['prefixes'])
+    local = PrefixMatcher(cx['namespace'])          # Element ids are defined in the document namespace
+    for n, eid in enumerate(document['elements']):
+        index.define(local.compress(eid), n)
+    for ref in document.get('documentRefs', []):
+        index.reference(ref['namespace'], ref['elements'])
     # Check defined vs copied namespaces and timestamps
     return cx
 
 
 def make_dot(context: dict, elist: list, fp: str) -> None:
     ex = {e['id']: k for k, e in enumerate(elist, start=1)}
+    compress = prefix_matcher(context).compress
     with open(os.path.splitext(fp)[0] + '.dot', 'w') as fx:
         fx.write('digraph G {\nnode [fontname=Arial, fontsize=8, shape=box, style=filled, fillcolor=lightskyblue1]\n')
         for e in elist:
-            eid = compress_iri(context, e['id'])
+            eid = compress(e['id'])
             # print(f"  n{ex[e['id']]}: {eid}: {e.get('name', eid)}")
             fx.write(f"n{ex[e['id']]} [label=\"{eid}\\n{e.get('name', '')}\"]\n")
             for t in e['type']:
                 for n in e['type'][t].get('elements', []):
-                    dest = f'n{ex[n]}' if n in ex else f'"{compress_iri(context, n)}"'
+                    dest = f'n{ex[n]}' if n in ex else f'"{compress(n)}"'
                     fx.write(f"  n{ex[e['id']]} -> {dest}\n")
         fx.write('}\n')
 
@@ -149,14 +104,18 @@ def make_dot(context: dict, elist: list, fp: str) -> None:
 if __name__ == '__main__':
     print(f'Installed JADN version: {jadn.__version__}\n')
     os.makedirs(OUT_DIR, exist_ok=True)
-    s = load_any(SCHEMA)
+    cache = SchemaCache()
+    s = cache.load(SCHEMA, load_any)['schema']
     sc = jadn.codec.Codec(s, verbose_rec=True, verbose_str=True)
+    plan = IriPlan.from_tree(cache.derived(SCHEMA, 'IriPlan', lambda schema: IriPlan(schema).root))
+    print(cache.summary())
     for f in os.scandir(DATA_DIR):
         if not f.is_file() or os.path.splitext(f)[1] not in ('.json'):
             continue
         print(f'  === {f.name}')
         doc = sc.decode('UnitOfTransfer', json.load(open(f.path)))
-        ctx = validate_document(doc)
-        x_elements = [expand_element(ctx, e) for e in doc['elements']]
+        ctx = validate_document(doc, plan)
+        x_elements = [expand_element(ctx, {'id': k, **e}) for k, e in doc['elements'].items()]
+        ctx['index'].report()
         dump_elements(ctx, x_elements)
         make_dot(ctx, x_elements, os.path.join(OUT_DIR, f.name))
@@ -1,104 +1,145 @@
 """
 Expand documents containing element+context into multiple individual elements
 """
+import asyncio
+import csv
+import hashlib
 import jadn
 import json
 import os
-from urllib.parse import urlparse
+import signal
+import sys
+import time
+from argparse import ArgumentParser
+from array import array
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+from itertools import islice
+from canonical import canonical_element, canonical_encoder
+from element_iri import DocumentIndex, IriPlan, PrefixMatcher, expand_iri, prefix_matcher
+from element_store import STORE_PATH, ElementStore
+from json_stream import JsonStreamReader, decode_properties
+from schema_cache import SchemaCache
+from transfer_format import FORMATS, FormatCodecs, document_format, format_path
 
 SCHEMA = 'Schemas/spdx-v3.jidl'
 DATA_DIR = 'Data3'
 OUT_DIR = 'Out'
+DOCUMENT_TYPE = 'TransferUnit'
+ELEMENT_TYPE = 'Element'
+STREAMED = ('elements',)        # Document arrays read one item at a time when streaming
+BATCH_QUEUE = 2                 # Documents read ahead per batch worker
+SERVE_CONCURRENCY = 8           # Requests checked at the same time by the server
+MAX_REQUEST = 1 << 28           # Maximum length of a request line
+LATENCY_WINDOW = 10000          # Number of recent request latencies used for server metrics
+DIGEST_CACHE_BYTES = 1 << 28    # Memory of element digests kept for reuse
+HASH_BATCH = 4096               # Streamed elements hashed at a time
+CONTAINS = 'CONTAINS'
+AMENDS = 'AMENDS'
+ANNOTATION = 'annotation'       # Graph edge type from annotation element to subject, not a RelationshipType
+ELEMENTS = 'elements'           # Graph edge type from a collection element to its member elements
+DOT_BATCH = 4096                # Lines written to graph files at a time
+CLUSTER_THRESHOLD = 100         # Clusters with more elements are collapsed into one node
+EXTERNAL = 'external'           # Namespace cluster of elements with IRIs in no known namespace
+DIFF_LIST = 20                  # Changes of each kind listed by --diff, all are counted and in the patch
 DEFAULT_PROPERTIES = ('specVersion', 'created', 'profile', 'dataLicense')
-IRI_LOCATIONS = ('id', 'created/by', '*/elements/*', 'relationship/from', 'relationship/to/*',
-                 '*/originator', 'elementRefs/id', 'annotation/subject')
 
+_worker = {}        # Per-process state of --workers processes
 
-def expand_iri(context: dict, element_id: str) -> str:
+
+def expand_ids(context: dict, element: dict) -> None:
     """
-    Convert an Element ID in namespace:local form to an IRI
+    Convert all IRIs in an element from namespace:local form to absolute IRI, at locations given by context plan
     """
-    if context:
-        u = urlparse(element_id)
-        if u.scheme:
-            if prefix := context['prefixes'].get(u.scheme, ''):
-                return prefix + u.path
-            return element_id
-        if element_id not in context.get('doc_ids', []):
-            print(f'    Undefined Element: {element_id}')
-        return context.get('namespace', '') + element_id
-    return element_id
+    context['plan'].rewrite(element, lambda iri: expand_iri(context, iri))
 
 
-def compress_iri(context: dict, iri: str) -> str:
+def compress_ids(context: dict, element: dict) -> None:
     """
-    Convert an Element ID IRI to namespace:local form
+    Convert all IRIs in an element from absolute IRI to namespace:local form, at locations given by context plan
     """
-    if context:
-        if base := context.get('namespace', ''):
-            if iri.startswith(base):
-                return iri.replace(base, '')
-        for k, v in context.get('prefixes', {}).items():
-            if iri.startswith(v):
-                return iri.replace(v, k + ':')
-    return iri
+    if not context:
+        return
+    compress = prefix_matcher(context).compress
+    context['plan'].rewrite(element, compress)
 
 
-def expand_ids(context: dict, element: dict, paths: list) -> None:
+class ElementDefaults(Mapping):
     """
-    Convert all IRIs in an element from namespace:local form to absolute IRI
-
-    Hardcode IRI locations for now; replace with path-driven update
+    Read-only Element property defaults of a document, expanded once and shared by all of its elements
     """
-    element.update({'id': expand_iri(context, element['id'])})
-    if 'created' in element:
-        element['created']['by'] = [expand_iri(context, k) for k in element['created']['by']]
-    for etype, eprops in element['type'].items():
-        for p in eprops:
-            if p in ('elements', 'rootElements', 'originator', 'members'):
-                eprops[p] = [expand_iri(context, k) for k in eprops[p]]
-        if etype == 'annotation':
-            eprops['subject'] = expand_iri(context, eprops['subject'])
-        elif etype == 'relationship':
-            eprops['from'] = expand_iri(context, eprops['from'])
-            eprops['to'] = [expand_iri(context, k) for k in eprops['to']]
+    __slots__ = ('values',)
 
+    def __init__(self, values: dict):
+        self.values = values
 
-def compress_ids(context: dict, element: dict) -> None:
+    def __getitem__(self, key: str):
+        return self.values[key]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __repr__(self) -> str:
+        return f'ElementDefaults({", ".join(self.values)})'
+
+
+class ExpandedElement(Mapping):
     """
-    Convert all IRIs in an element from absolute IRI to namespace:local form
+    Read-only view of an expanded element: its own decoded properties over the shared defaults of its document
 
-    Hardcode IRI locations for now; replace with path-driven update
+    Defaults are not copied into each element, and the IRIs of properties are interned by expand_iri,
+    so an IRI referenced by many elements is held once.  Keys are in the order of a dict built by
+    copying the defaults and then the element properties, and a plain dict is materialized only
+    to serialize the element.
     """
-    element.update({'id': compress_iri(context, element['id'])})
-    if 'created' in element:
-        element['created']['by'] = [compress_iri(context, k) for k in element['created']['by']]
-    for etype, eprops in element['type'].items():
-        for p in eprops:
-            if p in ('elements', 'rootElements', 'originator', 'members'):
-                eprops[p] = [compress_iri(context, k) for k in eprops[p]]
-        if etype == 'annotation':
-            eprops['subject'] = compress_iri(context, eprops['subject'])
-        elif etype == 'relationship':
-            eprops['from'] = compress_iri(context, eprops['from'])
-            eprops['to'] = [compress_iri(context, k) for k in eprops['to']]
+    __slots__ = ('properties', 'defaults')
+
+    def __init__(self, properties: dict, defaults: ElementDefaults):
+        self.properties = properties
+        self.defaults = defaults
+
+    def __getitem__(self, key: str):
+        if key in self.properties:
+            return self.properties[key]
+        return self.defaults[key]
+
+    def __iter__(self):
+        yield 'id'
+        yield from self.defaults
+        yield from (k for k in self.properties if k != 'id' and k not in self.defaults)
 
+    def __len__(self) -> int:
+        return len(self.properties) + sum(1 for k in self.defaults if k not in self.properties)
 
-def expand_element(context: dict, element: dict) -> dict:
+    def __repr__(self) -> str:
+        return f'ExpandedElement({dict(self)})'
+
+
+def expand_element(context: dict, element: dict) -> ExpandedElement:
     """
     Fill in Element properties from Context
+
+    The IRIs of the decoded element are expanded in place, and the element is not copied.
     """
-    element_x = {'id': ''}      # put id first
-    element_x.update({k: context[k] for k in DEFAULT_PROPERTIES if k in context})
-    element_x.update(element)
-    expand_ids(context, element_x, IRI_LOCATIONS)
-    return element_x
+    expand_ids(context, element)
+    return ExpandedElement(element, context['defaults'])
 
 
-def compress_element(context: dict, element_x: dict) -> dict:
-    element = {k: v for k, v in element_x.items() if v != context.get(k, '')}
-    compress_ids(context, element)
-    return element
+def compress_element(context: dict, element_x: Mapping) -> dict:
+    """
+    Return an element without the properties it shares with Context, with IRIs in namespace:local form
+
+    IRIs are compressed in copies of the containers that hold them, so the expanded element is not changed.
+    """
+    defaults = context.get('defaults', {})
+    element = {k: v for k, v in element_x.items() if v is not defaults.get(k)}    # Shared defaults, not equal values
+    return context['plan'].rewritten(element, prefix_matcher(context).compress) if context else element
 
 
 def load_any(path: str) -> (dict, None):
@@ -122,41 +163,1036 @@ def dump_elements(context: dict, elements: list[dict]) -> None:
         print(compress_element(context, e))
 
 
-def validate_document(document: dict) -> dict:
+def validate_document(document: dict, plan: IriPlan, element_ids: list = None) -> dict:
+    """
+    Create the context used to expand and compress elements of a document
+
+    :param element_ids: ids of the document elements, if document does not contain its elements
+    """
     cx = {k: document[k] for k in document if k not in ('elements', 'documentRefs', 'namespaceMap')}
-    cx['doc_ids'] = [compress_iri(cx, e['id']) for e in document['elements']]
-    cx['ref_ids'] = [ref['namespace'] + ':' + e for ref in document.get('documentRefs', []) for e in ref['elements']]
+    cx['plan'] = plan
     cx['prefixes'] = {prefix: uri for uri, prefix in document.get('namespaceMap', {}).items()}
+    cx['matcher'] = PrefixMatcher(cx.get('namespace', ''), cx['prefixes'])
+    cx['index'] = index = DocumentIndex(cx['prefixes'])
+    local = PrefixMatcher(cx['namespace'])          # Element ids are defined in the document namespace
+    element_ids = (e['id'] for e in document['elements']) if element_ids is None else element_ids
+    for n, eid in enumerate(element_ids):
+        index.define(local.compress(eid), n)
+    for ref in document.get('documentRefs', []):
+        index.reference(ref['namespace'], ref['elements'])
+    defaults = {k: cx[k] for k in DEFAULT_PROPERTIES if k in cx}
+    expand_ids(cx, defaults)
+    cx['defaults'] = ElementDefaults(defaults)
     # Check defined vs copied namespaces and timestamps
     return cx
 
 
-def make_dot(context: dict, elist: list, fp: str) -> None:
-    ex = {e['id']: k for k, e in enumerate(elist, start=1)}
+class DocumentView:
+    """
+    Lazy view of the elements of a decoded document, each expanded when it is first accessed
+
+    Elements are looked up by IRI or by compact (local or prefix:local) id through the ids indexed by
+    validate_document, so getting one element from a large document expands only that element.
+    Expanded elements are memoized by position, and iterating the view expands the rest in document order.
+    If a codec is given the elements are undecoded and each is also decoded on first access, raising
+    ValueError if it is invalid, so a document larger than $MaxElements can be queried.
+    References are checked as elements are expanded, so the index reports undefined references
+    only of the elements accessed so far.
+    """
+    def __init__(self, context: dict, elements: list, codec: jadn.codec.Codec = None):
+        self.context = context
+        self.elements = elements                # decoded elements are expanded in place on first access
+        self.codec = codec
+        self.expanded = {}                      # position: expanded element
+        self.matcher = prefix_matcher(context)
+
+    def position(self, element_id: str) -> (int, None):
+        """
+        Return the position in the document of the element with an IRI or compact id, or None if not defined
+        """
+        defined = self.context['index'].defined
+        if (n := defined.get(element_id)) is None:
+            prefix, sep, local = element_id.partition(':')
+            if sep and prefix in self.context['prefixes']:
+                element_id = self.context['prefixes'][prefix] + local
+            n = defined.get(self.matcher.compress(element_id))
+        return n
+
+    def at(self, n: int) -> ExpandedElement:
+        if (element_x := self.expanded.get(n)) is None:
+            element = self.elements[n] if self.codec is None else self.codec.decode(ELEMENT_TYPE, self.elements[n])
+            element_x = self.expanded[n] = expand_element(self.context, element)
+        return element_x
+
+    def get(self, element_id: str, default=None) -> (ExpandedElement, None):
+        return default if (n := self.position(element_id)) is None else self.at(n)
+
+    def __getitem__(self, element_id: str) -> ExpandedElement:
+        if (n := self.position(element_id)) is None:
+            raise KeyError(element_id)
+        return self.at(n)
+
+    def __contains__(self, element_id: str) -> bool:
+        return self.position(element_id) is not None
+
+    def __iter__(self):
+        return (self.at(n) for n in range(len(self.elements)))
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def __repr__(self) -> str:
+        return f'DocumentView({len(self.elements)} elements, {len(self.expanded)} expanded)'
+
+
+class DigestCache:
+    """
+    SHA-256 digests of canonical elements, shared by all documents checked in a run
+
+    An element copied into several documents expands to the same canonical bytes in each, and is
+    hashed only the first time.  Entries are keyed by element IRI and hold the canonical bytes with the
+    digest, so a hit is exact and costs a byte comparison instead of a SHA-256 computation.  A changed
+    element with the same IRI misses and replaces the entry.  The canonical bytes plus ENTRY_BYTES per
+    entry are counted against max_bytes, and the oldest entries are dropped when the cache is full.
+    """
+    ENTRY_BYTES = 250           # Dict slot, (canonical bytes, hex digest) tuple and bytes and digest objects
+
+    def __init__(self, max_bytes: int = DIGEST_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0               # Bytes counted for the entries in the cache
+        self.digests = {}           # element IRI: (canonical bytes, hex digest)
+        self.stats = defaultdict(float)
+
+    def hash(self, iris: list, blobs: list) -> list:
+        """
+        Return the hex SHA-256 digest of each canonical element in blobs, with element IRIs in iris
+        """
+        start = time.perf_counter()
+        cache, sha256 = self.digests, hashlib.sha256
+        digests = []
+        for iri, b in zip(iris, blobs):
+            if (entry := cache.get(iri)) is None or entry[0] != b:
+                self.size += len(b) - (len(entry[0]) if entry else -self.ENTRY_BYTES)
+                entry = cache[iri] = (b, sha256(b).hexdigest())
+                self.stats['hashed'] += 1
+            digests.append(entry[1])
+        self.stats['elements'] += len(blobs)
+        while self.size > self.max_bytes:
+            self.size -= len(cache.pop(next(iter(cache)))[0]) + self.ENTRY_BYTES
+        self.stats['hash_seconds'] += time.perf_counter() - start
+        return digests
+
+    def summary(self) -> str:
+        st = self.stats
+        sec = st['canonical_seconds'] + st['hash_seconds'] or 1e-9
+        return (f'Digest cache: {st["elements"]:.0f} elements, {st["hashed"]:.0f} hashed, '
+                f'{st["elements"] - st["hashed"]:.0f} cached, {st["bytes"] / 1e6:.2f} MB canonical; '
+                f'serialize {st["canonical_seconds"]:.3f} sec, hash {st["hash_seconds"]:.3f} sec, '
+                f'{st["elements"] / sec:,.0f} elements/sec')
+
+
+def explode_and_hash(elements_x: list, digests: DigestCache) -> list:
+    """
+    Re-serialize each expanded element as a stand-alone canonical value and compute its SHA-256 in bulk
+
+    :return: [(element IRI, hex digest, canonical size in bytes)] in element order
+    """
+    start = time.perf_counter()
+    blobs = [canonical_element(e) for e in elements_x]
+    digests.stats['canonical_seconds'] += time.perf_counter() - start
+    digests.stats['bytes'] += sum(map(len, blobs))
+    iris = [e['id'] for e in elements_x]
+    return [(eid, d, len(b)) for eid, b, d in zip(iris, blobs, digests.hash(iris, blobs))]
+
+
+def write_digests(fp, records: list) -> None:
+    fp.writelines(json.dumps({'id': eid, 'sha256': d, 'bytes': n}) + '\n' for eid, d, n in records)
+
+
+class RelationshipGraph:
+    """
+    Index of the relationships and annotations between expanded elements of all documents added
+
+    Elements are numbered in the order their IRIs are first seen.  The edges of each relationship type
+    are kept as parallel integer arrays (from, to, relationship element) and compiled on first query
+    into forward or reverse adjacency lists in CSR form: the neighbors of element n are
+    targets[offsets[n]:offsets[n + 1]].  An annotation is an ANNOTATION edge from the annotation element
+    to its subject.  After compiling, a query touches only the edges it follows.
+
+    A relationship copied into several documents is indexed once.  Relationships with the same IRI but
+    different content are each indexed, and reported as conflicts.
+    """
+    def __init__(self):
+        self.ids = {}               # IRI: element number
+        self.iris = []              # element number: IRI
+        self.edges = {}             # edge type: (from, to, relationship) element number arrays
+        self.compiled = {}          # (edge type, reverse): (offsets, targets, relationships)
+        self.indexed = {}           # relationship or annotation element number: {(edge type, from, to)} added
+
+    def node(self, iri: str) -> int:
+        if (n := self.ids.get(iri)) is None:
+            n = self.ids[iri] = len(self.iris)
+            self.iris.append(iri)
+        return n
+
+    def _add_edges(self, etype: str, src: str, dests: list, element_id: str) -> None:
+        if etype not in self.edges:
+            self.edges[etype] = array('i'), array('i'), array('i')
+        fr, to, rel = self.edges[etype]
+        s, r = self.node(src), self.node(element_id)
+        versions = self.indexed.setdefault(r, set())
+        if (version := (etype, src, tuple(dests))) in versions:     # Element copied into another document
+            return
+        versions.add(version)
+        for dest in dests:
+            fr.append(s)
+            to.append(self.node(dest))
+            rel.append(r)
+
+    def add(self, elements_x: list) -> None:
+        """
+        Index the relationship and annotation elements in a list of expanded elements
+        """
+        for e in elements_x:
+            if rel := e['type'].get('relationship'):
+                self._add_edges(rel['type'], rel['from'], rel['to'], e['id'])
+            elif ann := e['type'].get('annotation'):
+                self._add_edges(ANNOTATION, e['id'], (ann['subject'],), e['id'])
+            else:
+                self.node(e['id'])
+        self.compiled.clear()
+
+    def _adjacency(self, etype: str, reverse: bool) -> tuple:
+        if (key := (etype, reverse)) not in self.compiled:
+            fr, to, rel = self.edges.get(etype, (array('i'),) * 3)
+            fr, to = (to, fr) if reverse else (fr, to)
+            offsets = array('i', [0]) * (len(self.iris) + 1)
+            for s in fr:
+                offsets[s + 1] += 1
+            for n in range(len(self.iris)):
+                offsets[n + 1] += offsets[n]
+            targets, relationships, pos = array('i', to), array('i', rel), offsets[:-1]
+            for s, d, r in zip(fr, to, rel):        # Counting sort of edges by source element
+                targets[pos[s]], relationships[pos[s]] = d, r
+                pos[s] += 1
+            self.compiled[key] = offsets, targets, relationships
+        return self.compiled[key]
+
+    def related(self, iri: str, etype: str, reverse: bool = False) -> list:
+        """
+        Return the elements directly related to iri by etype edges (iri is the "to" element if reverse)
+        """
+        if (n := self.ids.get(iri)) is None:
+            return []
+        offsets, targets, _ = self._adjacency(etype, reverse)
+        return [self.iris[k] for k in targets[offsets[n]:offsets[n + 1]]]
+
+    def closure(self, iri: str, etype: str = CONTAINS, reverse: bool = False) -> list:
+        """
+        Return the elements reachable from iri by one or more etype edges, in breadth-first order
+        """
+        if (n := self.ids.get(iri)) is None:
+            return []
+        offsets, targets, _ = self._adjacency(etype, reverse)
+        seen, found, queue = {n}, [], deque((n,))
+        while queue:
+            k = queue.popleft()
+            for d in targets[offsets[k]:offsets[k + 1]]:
+                if d not in seen:
+                    seen.add(d)
+                    found.append(d)
+                    queue.append(d)
+        return [self.iris[k] for k in found]
+
+    def annotations(self, iri: str) -> list:
+        return self.related(iri, ANNOTATION, reverse=True)
+
+    def amends_chain(self, iri: str, reverse: bool = False) -> list:
+        """
+        Return the earlier revisions amended directly or indirectly by iri, or the later revisions if reverse
+        """
+        return self.closure(iri, AMENDS, reverse)
+
+    def conflicts(self) -> dict:
+        """
+        Return {IRI: number of different versions} of relationships and annotations indexed with different content
+        """
+        return {self.iris[r]: len(v) for r, v in self.indexed.items() if len(v) > 1}
+
+    def report(self) -> None:
+        print(f'  {self!r}')
+        for etype in sorted(self.edges):
+            print(f'    {etype}: {len(self.edges[etype][0])}')
+        contains = self._adjacency(CONTAINS, False)[0]
+        amends, amended = self._adjacency(AMENDS, False)[0], self._adjacency(AMENDS, True)[0]
+        for n, iri in enumerate(self.iris):
+            if contains[n] < contains[n + 1]:
+                print(f'    {iri} contains {len(self.closure(iri))} elements')
+            if amends[n] < amends[n + 1] and amended[n] == amended[n + 1]:     # Latest revision
+                print(f'    {iri} amends {" -> ".join(self.amends_chain(iri))}')
+            if annotations := self.annotations(iri):
+                print(f'    {iri} annotations: {", ".join(annotations)}')
+        for iri, n in self.conflicts().items():
+            print(f'    Conflicting relationships: {iri} has {n} different versions')
+
+    def __repr__(self) -> str:
+        edges = sum(len(e[0]) for e in self.edges.values())
+        return f'RelationshipGraph({len(self.iris)} elements, {edges} edges, {len(self.edges)} edge types)'
+
+
+def stream_context(codec: jadn.codec.Codec, schema: dict, plan: IriPlan, path: str) -> dict:
+    """
+    First pass over a streamed document: read document properties, which may follow the elements,
+    and the ids of defined elements, and return the document context
+    """
+    props, ids = {}, []
+    with open(path, encoding='utf8') as fp:
+        for k, v in JsonStreamReader(fp).items(STREAMED):
+            if k == 'elements':
+                ids.append(v.get('id', '') if isinstance(v, dict) else '')     # Reported by the second pass
+            else:
+                props[k] = v
+    return validate_document(decode_properties(codec, schema, DOCUMENT_TYPE, props, STREAMED), plan, ids)
+
+
+def stream_elements(codec: jadn.codec.Codec, context: dict, path: str, errors: list = None):
+    """
+    Second pass over a streamed document: generate its elements, decoded and expanded one at a time
+
+    :param errors: list to which (index, error message) of invalid elements are appended and the elements
+        skipped; if None, an invalid element raises ValueError
+    """
+    with open(path, encoding='utf8') as fp:
+        n = 0
+        for k, v in JsonStreamReader(fp).items(STREAMED):
+            if k == 'elements':
+                try:
+                    yield expand_element(context, codec.decode(ELEMENT_TYPE, v))
+                except ValueError as e:
+                    if errors is None:
+                        raise
+                    errors.append((n, str(e)))
+                n += 1
+
+
+def stream_document(codec: jadn.codec.Codec, schema: dict, plan: IriPlan, path: str, out_path: str,
+                    digests: DigestCache = None, digest_path: str = None, graph: RelationshipGraph = None,
+                    store: ElementStore = None) -> tuple:
+    """
+    Validate and expand a document one element at a time, writing expanded elements as JSON lines
+
+    The first pass reads document properties, which may follow the elements, and the ids of defined
+    elements.  The second pass decodes, expands and writes each element, checking its references against
+    the ids from the first pass.  Neither pass holds more than one element (or HASH_BATCH elements
+    if digests are written to digest_path or elements are stored) in memory.  Invalid elements are reported
+    and skipped.
+    :return: (number of valid elements, document context)
+    """
+    ctx = stream_context(codec, schema, plan, path)
+    n, batch, first, errors = 0, [], True, []
+    with open(out_path, 'w', encoding='utf8') as fo, \
+            (open(digest_path, 'w', encoding='utf8') if digest_path else StringIO()) as fd:
+        for element_x in stream_elements(codec, ctx, path, errors):
+            fo.write(json.dumps(codec.encode(ELEMENT_TYPE, dict(element_x))) + '\n')
+            n += 1
+            if graph:
+                graph.add([element_x])
+            if digest_path or store:
+                batch.append(element_x)
+                if len(batch) == HASH_BATCH:
+                    save_batch(ctx, path, batch, first, fd, digests, store)
+                    batch, first = [], False
+        if batch:
+            save_batch(ctx, path, batch, first, fd, digests, store)
+    for k, err in errors:
+        print(f'    Element {k}: {err}')
+    ctx['index'].report()
+    return n, ctx
+
+
+def save_batch(ctx: dict, path: str, batch: list, first: bool, fd, digests: DigestCache, store: ElementStore) -> None:
+    """
+    Write the digests of a batch of streamed elements and add them to the element store
+    """
+    if digests:
+        write_digests(fd, explode_and_hash(batch, digests))
+    if store:
+        store.ingest(ctx['namespace'], path, batch, replace=first)
+
+
+def init_worker(schema: dict, plan: IriPlan) -> None:
+    """
+    Build the Codec of a worker process once, for all shards or documents it checks
+    """
+    _worker['codec'] = jadn.codec.Codec(schema, verbose_rec=True, verbose_str=True)
+    _worker['plan'] = plan
+
+
+def check_shard(context: dict, start: int, elements: list) -> tuple:
+    """
+    Decode and expand a contiguous shard of document elements in a worker process
+
+    :param start: index in the document of the first element in the shard
+    :return: (start, expanded elements, [(index, error message)], {undefined element id: references})
+    """
+    codec = _worker['codec']
+    x_elements, errors = [], []
+    for n, element in enumerate(elements, start=start):
+        try:
+            x_elements.append(expand_element(context, codec.decode(ELEMENT_TYPE, element)))
+        except ValueError as e:
+            errors.append((n, str(e)))
+    return start, x_elements, errors, dict(context['index'].undefined)
+
+
+def document_context(codec: jadn.codec.Codec, schema: dict, plan: IriPlan, document: dict) -> dict:
+    """
+    Decode the properties of an undecoded document and create its context, without decoding its elements
+    """
+    props = decode_properties(codec, schema, DOCUMENT_TYPE, {k: v for k, v in document.items() if k not in STREAMED},
+                              STREAMED)
+    ids = [e.get('id', '') if isinstance(e, dict) else '' for e in document.get('elements', [])]
+    return validate_document(props, plan, ids)
+
+
+def check_sharded(pool: ProcessPoolExecutor, shards: int, codec: jadn.codec.Codec, schema: dict, plan: IriPlan,
+                  document: dict) -> tuple:
+    """
+    Validate and expand the elements of an undecoded document in parallel
+
+    Document properties are decoded here and the context is sent to the workers once per shard.
+    Element errors do not stop validation; each is returned with the index of the element in the document.
+    :return: (context, expanded elements in document order, [(index, error message)] in document order)
+    """
+    elements = document.get('elements', [])
+    ctx = document_context(codec, schema, plan, document)
+    size = -(-len(elements) // shards) or 1
+    shard_ctx = {**ctx, 'index': ctx['index'].shard()}     # Shards return only their own undefined references
+    futures = [pool.submit(check_shard, shard_ctx, k, elements[k:k + size]) for k in range(0, len(elements), size)]
+    results = [future.result() for future in futures]      # Merge in document order, not completion order
+    x_elements, errors = [], []
+    for start, x_shard, e_shard, undefined in results:
+        for element_x in x_shard:       # Unpickled elements share a copy of the defaults, share the context's
+            element_x.defaults = ctx['defaults']
+        x_elements += x_shard
+        errors += e_shard
+        for element_id, count in undefined.items():
+            ctx['index'].undefined[element_id] += count
+    return ctx, x_elements, errors
+
+
+def document_paths(paths: list) -> list:
+    """
+    List document files, replacing each directory in paths by the .json files it contains
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(f.path for f in os.scandir(path) if f.is_file() and os.path.splitext(f)[1] == '.json')
+        else:
+            files.append(path)
+    return files
+
+
+def check_text(text: str) -> tuple:
+    """
+    Parse, validate and expand one serialized document using the Codec of this worker
+
+    :return: (result record, context, expanded elements), context and elements are None if the document is invalid.
+        Result: status, element count, undefined references, error and timings in seconds
+    """
+    codec, plan = _worker['codec'], _worker['plan']
+    result = {'status': 'valid', 'elements': 0, 'undefined': {}, 'timings': {}}
+    t = [time.perf_counter()]
+    try:
+        data = json.loads(text)
+        t.append(time.perf_counter())
+        doc = codec.decode(DOCUMENT_TYPE, data)
+        t.append(time.perf_counter())
+        ctx = validate_document(doc, plan)
+        x_elements = [expand_element(ctx, e) for e in doc['elements']]
+        t.append(time.perf_counter())
+    except ValueError as e:
+        result.update({'status': 'invalid', 'error': str(e)})
+        ctx = x_elements = None
+    else:
+        result.update({'elements': len(x_elements), 'undefined': dict(ctx['index'].undefined)})
+    result['timings'] = {k: round(t2 - t1, 6) for k, t1, t2 in zip(('parse', 'decode', 'expand'), t, t[1:])}
+    return result, ctx, x_elements
+
+
+def check_file(path: str, text: str, dump: bool = False, dot: bool = False) -> dict:
+    """
+    Validate and expand one document in a batch worker process
+
+    :return: result record of check_text, with file name and optional element dump
+    """
+    result, ctx, x_elements = check_text(text)
+    result = {'file': path, **result}
+    if ctx and dot:
+        make_dot(ctx, x_elements, os.path.join(OUT_DIR, os.path.basename(path)))
+    if ctx and dump:
+        with redirect_stdout(buf := StringIO()):
+            dump_elements(ctx, x_elements)
+        result['dump'] = buf.getvalue()
+    return result
+
+
+def check_request(text: str) -> dict:
+    return check_text(text)[0]
+
+
+def is_command(line: str, command: str) -> bool:
+    """
+    Return True if a request line is the server command {"command": command}, without parsing long lines
+    """
+    try:
+        return len(line) < 100 and json.loads(line) == {'command': command}
+    except ValueError:
+        return False
+
+
+class ValidationServer:
+    """
+    Check documents received as JSON lines, using Codecs that stay loaded between requests
+
+    Each request line is a serialized TransferUnit and each response line is its check_text result
+    with the request latency added; responses on a connection are in request order.  A request
+    {"command": "metrics"} returns server metrics.  At most `concurrency` requests are checked at
+    once; when that limit is reached the server stops reading requests until one completes.
+    """
+    def __init__(self, executor: Executor, concurrency: int = SERVE_CONCURRENCY):
+        self.executor = executor
+        self.slots = asyncio.Semaphore(concurrency)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.stats = defaultdict(int)
+        self.started = time.perf_counter()
+
+    async def _request(self, line: str) -> dict:
+        start = time.perf_counter()
+        self.stats['active'] += 1
+        self.stats['max_active'] = max(self.stats['max_active'], self.stats['active'])
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, check_request, line)
+        finally:
+            self.stats['active'] -= 1
+            self.slots.release()
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+        self.stats['requests'] += 1
+        self.stats[result['status']] += 1
+        result['timings']['latency'] = round(latency, 6)
+        return result
+
+    async def handle(self, reader: asyncio.StreamReader, write: callable) -> None:
+        """
+        Serve requests from reader until end of input, passing each response line to the coroutine write
+        """
+        responses = asyncio.Queue()
+
+        async def respond() -> None:
+            while (task := await responses.get()) is not None:
+                result = await task if isinstance(task, asyncio.Task) else task()
+                await write(json.dumps(result) + '\n')
+
+        responder = asyncio.create_task(respond())
+        while line := (await reader.readline()).decode():
+            if is_command(line, 'metrics'):
+                await responses.put(self.metrics)       # After responses to earlier requests
+            elif line.strip():
+                await self.slots.acquire()
+                await responses.put(asyncio.create_task(self._request(line)))
+        await responses.put(None)
+        await responder
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async def write(text: str) -> None:
+            writer.write(text.encode())
+            await writer.drain()
+
+        self.stats['connections'] += 1
+        try:
+            await self.handle(reader, write)
+        except (ConnectionError, ValueError) as e:      # Client disconnected or request exceeded MAX_REQUEST
+            print(f'Connection closed: {e}', file=sys.stderr)
+        finally:
+            writer.close()
+
+    def metrics(self) -> dict:
+        lat = sorted(self.latencies)
+
+        def ms(p: float) -> float:
+            return round(1000 * lat[min(len(lat) - 1, int(p * len(lat)))], 3) if lat else 0
+
+        return {
+            'uptime': round(time.perf_counter() - self.started, 3),
+            **{k: self.stats[k] for k in ('connections', 'requests', 'valid', 'invalid', 'active', 'max_active')},
+            'latency_ms': {
+                'mean': round(1000 * sum(lat) / len(lat), 3) if lat else 0,
+                'p50': ms(.5), 'p90': ms(.9), 'p99': ms(.99), 'max': ms(1)
+            }
+        }
+
+
+async def serve(server: ValidationServer, socket_path: str) -> None:
+    """
+    Serve requests on a Unix socket, or from stdin to stdout if socket_path is "-", until end of input or a signal
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        if socket_path == '-':
+            reader = asyncio.StreamReader(limit=MAX_REQUEST)
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+            async def write(text: str) -> None:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+
+            await server.handle(reader, write)
+        else:
+            srv = await asyncio.start_unix_server(server.handle_connection, socket_path, limit=MAX_REQUEST)
+            print(f'Listening on {socket_path}', file=sys.stderr)
+            async with srv:
+                await srv.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if socket_path != '-' and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+async def send_documents(socket_path: str, files: list) -> None:
+    """
+    Send documents to a server, print a response line for each, then print the server metrics
+    """
+    reader, writer = await asyncio.open_unix_connection(socket_path, limit=MAX_REQUEST)
+
+    async def send() -> None:
+        for path in files:
+            writer.write((json.dumps(json.loads(read_text(path))) + '\n').encode())
+            await writer.drain()
+        writer.write(b'{"command": "metrics"}\n')
+        writer.write_eof()
+
+    sender = asyncio.create_task(send())
+    while line := await reader.readline():
+        print(line.decode(), end='')
+    await sender
+    writer.close()
+
+
+def read_text(path: str) -> str:
+    with open(path, encoding='utf8') as fp:
+        return fp.read()
+
+
+async def check_batch(pool: ProcessPoolExecutor, workers: int, files: list, fp, dump: bool = False,
+                      dot: bool = False) -> dict:
+    """
+    Validate a batch of documents, reading files in threads while workers decode previously read documents
+
+    One JSON line is written to fp for each document, in completion order.  A document that cannot be
+    read has status "unreadable", and one whose check fails with an unexpected exception, including a
+    worker process that died, has status "error"; neither stops the batch.
+    :return: totals of the batch
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(BATCH_QUEUE * workers)     # Bounds the number of documents held in memory
+    totals = defaultdict(int)
+
+    async def check(path: str) -> None:
+        async with slots:
+            start = time.perf_counter()
+            try:
+                text = await asyncio.to_thread(read_text, path)
+            except (OSError, UnicodeDecodeError) as e:
+                result = {'file': path, 'status': 'unreadable', 'elements': 0, 'undefined': {},
+                          'error': str(e), 'timings': {}}
+            else:
+                read = time.perf_counter() - start
+                try:
+                    result = await loop.run_in_executor(pool, check_file, path, text, dump, dot)
+                except Exception as e:
+                    result = {'file': path, 'status': 'error', 'elements': 0, 'undefined': {},
+                              'error': f'{type(e).__name__}: {e}', 'timings': {}}
+                result['timings'] = {'read': round(read, 6), **result['timings']}
+                totals['bytes'] += len(text)
+        if output := result.pop('dump', ''):
+            print(f'  === {path}\n{output}', end='')
+        fp.write(json.dumps(result) + '\n')
+        totals['documents'] += 1
+        totals[result['status']] += 1
+        totals['elements'] += result['elements']
+        totals['undefined'] += len(result['undefined'])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(check(path) for path in files))
+    totals['seconds'] = time.perf_counter() - start
+    return totals
+
+
+def batch_summary(totals: dict) -> str:
+    sec = totals['seconds'] or 1e-9
+    return (f'{totals["documents"]} documents ({totals["valid"]} valid, {totals["invalid"]} invalid, '
+            f'{totals["unreadable"]} unreadable, {totals["error"]} errors), {totals["elements"]} elements, '
+            f'{totals["undefined"]} undefined references, {totals["bytes"] / 1e6:.2f} MB in {sec:.3f} sec\n'
+            f'{totals["documents"] / sec:.1f} documents/sec, {totals["elements"] / sec:.0f} elements/sec, '
+            f'{totals["bytes"] / 1e6 / sec:.2f} MB/sec')
+
+
+def resolve_references(store: ElementStore, references: list) -> None:
+    """
+    Resolve the documentRefs of each checked document against the element store, after all documents are stored
+    """
+    print('Referenced elements:')
+    for name, referenced in references:
+        if not (n := sum(len(ids) for ids in referenced.values())):
+            continue
+        resolved, missing, conflicts = store.resolve(referenced)
+        print(f'  {name}: {len(resolved)} of {n} resolved')
+        for iri in missing:
+            print(f'    Not found: {iri}')
+        for iri in conflicts:
+            print(f'    Conflicting copies: {iri}')
+
+
+def element_edges(elist: list):
+    """
+    Generate (from, to, edge type, element) IRIs of collection members, relationships and annotations
+    """
+    for e in elist:
+        for t, v in e['type'].items():
+            if t == 'relationship':
+                for dest in v['to']:
+                    yield v['from'], dest, v['type'], e['id']
+            elif t == 'annotation':
+                yield e['id'], v['subject'], ANNOTATION, e['id']
+            else:
+                for dest in v.get('elements', []):
+                    yield e['id'], dest, ELEMENTS, e['id']
+
+
+def cluster_keys(context: dict, elist: list, ids: list, cluster: str) -> list:
+    """
+    Return the cluster of each element: its namespace, or the element that CONTAINS it (or None)
+
+    Elements whose IRIs are in neither the document namespace nor a namespaceMap namespace are in the
+    EXTERNAL cluster.
+    """
+    if cluster == 'namespace':
+        namespace = prefix_matcher(context).namespace
+        return [namespace(e['id']) or EXTERNAL for e in elist]
+    compress = prefix_matcher(context).compress
+    container = {}
+    for src, dest, etype, eid in element_edges(elist):
+        if etype == CONTAINS:
+            container.setdefault(compress(dest), compress(src))
+            container.setdefault(compress(src), compress(src))
+    return [container.get(eid) for eid in ids]
+
+
+def make_dot(context: dict, elist: list, fp: str, cluster: str = None, threshold: int = CLUSTER_THRESHOLD) -> None:
+    """
+    Write a DOT graph of the elements of a document with member, relationship and annotation edges
+
+    Lines are written in batches of DOT_BATCH.  If cluster is "contains" or "namespace", elements are
+    drawn in subgraph clusters by containing package or namespace prefix, and a cluster of more than
+    threshold elements is collapsed into a single node.
+    """
+    compress = prefix_matcher(context).compress
+    ids = [compress(e['id']) for e in elist]
+    ex = {eid: k for k, eid in enumerate(ids, start=1)}
+    groups = defaultdict(list)
+    for k, key in enumerate(cluster_keys(context, elist, ids, cluster) if cluster else [None] * len(ids), start=1):
+        groups[key].append(k)
+    collapsed = {}          # element number: name of collapsed cluster node
+
+    def label(text: str) -> str:
+        return text.replace('\\', '\\\\').replace('"', '\\"')
+
+    def node(iri: str) -> str:
+        eid = compress(iri)
+        return f'"{label(eid)}"' if (k := ex.get(eid)) is None else collapsed.get(k, f'n{k}')
+
     with open(os.path.splitext(fp)[0] + '.dot', 'w') as fx:
-        fx.write('digraph G {\nnode [fontname=Arial, fontsize=8, shape=box, style=filled, fillcolor=lightskyblue1]\n')
-        for e in elist:
-            eid = compress_iri(context, e['id'])
-            # print(f"  n{ex[e['id']]}: {eid}: {e.get('name', eid)}")
-            fx.write(f"n{ex[e['id']]} [label=\"{eid}\\n{e.get('name', '')}\"]\n")
-            for t in e['type']:
-                for n in e['type'][t].get('elements', []):
-                    dest = f'n{ex[n]}' if n in ex else f'"{compress_iri(context, n)}"'
-                    fx.write(f"  n{ex[e['id']]} -> {dest}\n")
-        fx.write('}\n')
+        buf = ['digraph G {\nnode [fontname=Arial, fontsize=8, shape=box, style=filled, fillcolor=lightskyblue1]\n']
+
+        def write(line: str) -> None:
+            buf.append(line)
+            if len(buf) >= DOT_BATCH:
+                fx.writelines(buf)
+                buf.clear()
+
+        for c, (key, members) in enumerate(groups.items()):
+            if key is not None and len(members) > threshold:
+                write(f'c{c} [label="{label(key)}\\n{len(members)} elements", shape=folder, fillcolor=khaki]\n')
+                collapsed.update((k, f'c{c}') for k in members)
+                continue
+            if key is not None:
+                write(f'subgraph cluster_{c} {{\nlabel="{label(key)}"\n')
+            for k in members:
+                write(f'n{k} [label="{label(ids[k - 1])}\\n{label(elist[k - 1].get("name", ""))}"]\n')
+            if key is not None:
+                write('}\n')
+        drawn = set()       # Edges to or from collapsed clusters, drawn once
+        for src, dest, etype, eid in element_edges(elist):
+            s, d = node(src), node(dest)
+            if s.startswith('c') or d.startswith('c'):
+                if s == d or (s, d, etype) in drawn:
+                    continue
+                drawn.add((s, d, etype))
+            attrs = '' if etype == ELEMENTS else ' [style=dashed]' if etype == ANNOTATION else f' [label="{etype}"]'
+            write(f'  {s} -> {d}{attrs}\n')
+        write('}\n')
+        fx.writelines(buf)
+
+
+def write_edges(elist: list, fp: str, fmt: str = 'csv') -> None:
+    """
+    Write the edges of a document as CSV (from, to, type, element) or JSON lines, in batches of DOT_BATCH
+    """
+    path = os.path.splitext(fp)[0] + ('.edges.csv' if fmt == 'csv' else '.edges.jsonl')
+    edges = element_edges(elist)
+    with open(path, 'w', newline='', encoding='utf8') as fx:
+        if fmt == 'csv':
+            writer = csv.writer(fx)
+            writer.writerow(('from', 'to', 'type', 'element'))
+            while batch := list(islice(edges, DOT_BATCH)):
+                writer.writerows(batch)
+        else:
+            keys = ('from', 'to', 'type', 'element')
+            while batch := list(islice(edges, DOT_BATCH)):
+                fx.writelines(json.dumps(dict(zip(keys, edge))) + '\n' for edge in batch)
+
+
+class DiffReport:
+    """
+    Counts of element and edge changes between two documents, with the first DIFF_LIST of each kind
+    """
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.examples = defaultdict(list)
+
+    def add(self, change: str, item) -> None:
+        self.counts[change] += 1
+        if len(self.examples[change]) < DIFF_LIST:
+            self.examples[change].append(item)
+
+    def report(self) -> None:
+        print('    ' + ', '.join(f'{self.counts[c]} {c}' for c in (
+            'unchanged', 'added', 'modified', 'removed', 'referenced', 'edges added', 'edges removed')))
+        for change, items in self.examples.items():
+            more = self.counts[change] - len(items)
+            print(f'    {change.capitalize()}:' + (f' (first {len(items)} of {self.counts[change]})' if more else ''))
+            for item in items:
+                print(f'      {item if isinstance(item, str) else "{0} -[{2}]-> {1}".format(*item)}')
+
+
+def diff_documents(codec: jadn.codec.Codec, schema: dict, plan: IriPlan, old_path: str, new_path: str,
+                   patch_path: str) -> DiffReport:
+    """
+    Compare two documents by the canonical digests of their expanded elements, writing a patch as JSON lines
+
+    The old document is streamed into hash maps of element IRI: SHA-256 digest and of its (from, to, type)
+    edges.  The new document is then streamed and each element is looked up once by IRI, so the time is
+    linear in the number of elements and only digests and edges are held in memory.  Added and modified
+    elements are written to the patch as they are found, then old elements not in the new document.
+    Old elements that the new document references through documentRefs are counted as referenced, and
+    neither they nor their edges are removed.
+    The patch starts with {"old": namespace, "new": namespace}, followed by one line per change:
+    {"op": "add"|"modify", "element": canonical expanded element} or {"op": "remove", "id": IRI}.
+    """
+    diff = DiffReport()
+    old_ctx = stream_context(codec, schema, plan, old_path)
+    old, old_edges = {}, {}             # IRI: digest, (from, to, type): element IRI
+    for element_x in stream_elements(codec, old_ctx, old_path):
+        old[element_x['id']] = hashlib.sha256(canonical_element(element_x)).digest()
+        old_edges.update((edge[:3], edge[3]) for edge in element_edges([element_x]))
+
+    new_ctx = stream_context(codec, schema, plan, new_path)
+    new_edges = set()
+    with open(patch_path, 'wb') as fp:
+        fp.write(canonical_encoder.encode({'old': old_ctx['namespace'], 'new': new_ctx['namespace']}).encode() + b'\n')
+        for element_x in stream_elements(codec, new_ctx, new_path):
+            blob = canonical_element(element_x)
+            if (digest := old.pop(element_x['id'], None)) is None:
+                diff.add('added', element_x['id'])
+                fp.write(b'{"op":"add","element":' + blob + b'}\n')
+            elif digest != hashlib.sha256(blob).digest():
+                diff.add('modified', element_x['id'])
+                fp.write(b'{"op":"modify","element":' + blob + b'}\n')
+            else:
+                diff.counts['unchanged'] += 1
+            for edge in element_edges([element_x]):
+                if (edge := edge[:3]) not in new_edges:
+                    new_edges.add(edge)
+                    if old_edges.pop(edge, None) is None:
+                        diff.add('edges added', edge)
+        referenced = {ns + local for ns, ids in new_ctx['index'].referenced.items() for local in ids}
+        for iri in old:
+            if iri in referenced:
+                diff.counts['referenced'] += 1
+            else:
+                diff.add('removed', iri)
+                fp.write(b'{"op":"remove","id":' + json.dumps(iri).encode() + b'}\n')
+    for edge, iri in old_edges.items():
+        if iri not in referenced:
+            diff.add('edges removed', edge)
+    return diff
 
 
 if __name__ == '__main__':
+    parser = ArgumentParser(description='Validate SPDX v3 documents and expand them into individual elements',
+                            fromfile_prefix_chars='@')
+    parser.add_argument('paths', nargs='*', default=[DATA_DIR],
+                        help=f'documents and directories of documents to check (default: {DATA_DIR}), '
+                             f'@FILE reads paths from FILE, one per line')
+    parser.add_argument('--stream', action='store_true',
+                        help='decode and expand one element at a time, writing expanded elements as JSON lines '
+                             '(verbose documents, others are decoded whole)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='validate and expand the elements of each document in N processes')
+    parser.add_argument('-b', '--batch', metavar='RESULTS',
+                        help='check documents in a pipeline of N workers, writing a JSON line per document '
+                             'to RESULTS ("-" for stdout)')
+    parser.add_argument('--dump', action='store_true', help='print expanded elements in batch mode')
+    parser.add_argument('--dot', action='store_true', help='write DOT graphs in batch mode')
+    parser.add_argument('--hash', action='store_true',
+                        help='write the SHA-256 digest of each canonical expanded element as JSON lines')
+    parser.add_argument('--graph', action='store_true',
+                        help='index relationships and annotations across all documents and report CONTAINS '
+                             'closures, AMENDS chains and annotations')
+    parser.add_argument('--cluster', choices=('contains', 'namespace'),
+                        help='draw DOT graph elements in clusters by containing package or namespace')
+    parser.add_argument('--cluster-threshold', type=int, default=CLUSTER_THRESHOLD,
+                        help=f'collapse DOT clusters with more elements into one node (default: {CLUSTER_THRESHOLD})')
+    parser.add_argument('--edges', choices=('csv', 'jsonl'), help='also write the edges of each document to Out/')
+    parser.add_argument('--store', nargs='?', const=STORE_PATH, metavar='DB',
+                        help=f'add expanded elements to an element store (default: {STORE_PATH}) and resolve '
+                             f'documentRefs against it')
+    parser.add_argument('--convert', choices=tuple(FORMATS),
+                        help='also write each checked document to Out/ in this encoding; documents are read '
+                             'in the encoding given by their suffix (.json, .compact.json or .concise.json)')
+    parser.add_argument('-e', '--element', action='append', metavar='ID',
+                        help='print only the expanded elements with this IRI or compact id (repeatable), '
+                             'expanding no other elements')
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two documents by element digests and write a patch to Out/')
+    parser.add_argument('--serve', metavar='SOCKET',
+                        help='check JSON-line requests received on Unix socket SOCKET ("-" for stdin) '
+                             'in N worker processes')
+    parser.add_argument('--concurrency', type=int, default=SERVE_CONCURRENCY,
+                        help=f'maximum requests checked at the same time by the server '
+                             f'(default: {SERVE_CONCURRENCY})')
+    parser.add_argument('--connect', metavar='SOCKET', help='send documents to the server listening on SOCKET')
+    args = parser.parse_args()
+    if args.connect:
+        asyncio.run(send_documents(args.connect, document_paths(args.paths)))
+        sys.exit(0)
+    if args.serve == '-':
+        sys.stdout = sys.stderr     # Keep stdout for responses
     print(f'Installed JADN version: {jadn.__version__}\n')
     os.makedirs(OUT_DIR, exist_ok=True)
-    s = load_any(SCHEMA)
+    cache = SchemaCache()
+    s = cache.load(SCHEMA, load_any)['schema']
     sc = jadn.codec.Codec(s, verbose_rec=True, verbose_str=True)
-    for f in os.scandir(DATA_DIR):
-        if not f.is_file() or os.path.splitext(f)[1] not in ('.json'):
+    codecs = FormatCodecs(s, sc)
+    plan = IriPlan.from_tree(cache.derived(SCHEMA, 'IriPlan', lambda schema: IriPlan(schema).root))
+    print(cache.summary())
+    if args.serve:
+        sys.stdout = sys.__stdout__
+        executor = ProcessPoolExecutor if args.workers > 1 else ThreadPoolExecutor
+        with executor(max(args.workers, 1), initializer=init_worker, initargs=(s, plan)) as pool:
+            pool.submit(int).result()       # Start workers and build their Codecs before accepting requests
+            server = ValidationServer(pool, args.concurrency)
+            asyncio.run(serve(server, args.serve))
+        print(json.dumps(server.metrics()), file=sys.stderr)
+        sys.exit(0)
+
+    if args.diff:
+        old_path, new_path = args.diff
+        print(f'  === {os.path.basename(old_path)} -> {os.path.basename(new_path)}')
+        start = time.perf_counter()
+        patch = os.path.join(OUT_DIR, '{}--{}.patch.jsonl'.format(
+            *(os.path.splitext(os.path.basename(p))[0] for p in args.diff)))
+        diff_documents(sc, s, plan, old_path, new_path, patch).report()
+        print(f'    Patch written to {patch} in {time.perf_counter() - start:.2f} sec')
+        sys.exit(0)
+
+    files = document_paths(args.paths)
+    if args.batch:
+        workers = max(args.workers, 1)
+        fp = sys.stdout if args.batch == '-' else open(args.batch, 'w', encoding='utf8')
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(s, plan)) as pool:
+            totals = asyncio.run(check_batch(pool, workers, files, fp, args.dump, args.dot))
+        if fp is not sys.stdout:
+            fp.close()
+        print(batch_summary(totals), file=sys.stderr if fp is sys.stdout else sys.stdout)
+        sys.exit(0)
+
+    pool = ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(s, plan)) if args.workers > 1 else None
+    digests = DigestCache() if args.hash else None
+    graph = RelationshipGraph() if args.graph else None
+    store = ElementStore(args.store) if args.store else None
+    references = []         # (document name, {namespace: referenced element ids}) resolved after all are stored
+    for path in files:
+        name = os.path.basename(path)
+        print(f'  === {name}')
+        digest_path = os.path.join(OUT_DIR, os.path.splitext(name)[0] + '.sha256.jsonl') if args.hash else None
+        fmt = document_format(path)
+        if args.stream and fmt == 'verbose':
+            out = os.path.join(OUT_DIR, os.path.splitext(name)[0] + '.jsonl')
+            n, ctx = stream_document(sc, s, plan, path, out, digests, digest_path, graph, store)
+            print(f'    {n} elements written to {out}')
+            references.append((name, ctx['index'].referenced))
             continue
-        print(f'  === {f.name}')
-        doc = sc.decode('UnitOfTransfer', json.load(open(f.path)))
-        ctx = validate_document(doc)
-        x_elements = [expand_element(ctx, e) for e in doc['elements']]
+        if args.element:
+            if fmt == 'verbose':
+                doc = json.load(open(path))
+                view = DocumentView(document_context(sc, s, plan, doc), doc.get('elements', []), sc)
+            else:
+                doc = codecs.load(DOCUMENT_TYPE, path)
+                view = DocumentView(validate_document(doc, plan), doc['elements'])
+            for element_id in args.element:
+                element_x = view.get(element_id)
+                print(f'    {element_id}: ' + ('not defined' if element_x is None else
+                                                str(compress_element(view.context, element_x))))
+            continue
+        if pool and fmt == 'verbose' and not args.convert:      # Other documents are decoded whole
+            ctx, x_elements, errors = check_sharded(pool, args.workers, sc, s, plan, json.load(open(path)))
+            for n, err in errors:
+                print(f'    Element {n}: {err}')
+        else:
+            doc = codecs.load(DOCUMENT_TYPE, path)
+            if args.convert:    # Before expansion, which rewrites the IRIs of decoded elements in place
+                out = os.path.join(OUT_DIR, format_path(name, args.convert))
+                codecs.dump(DOCUMENT_TYPE, doc, out, args.convert)
+                print(f'    {args.convert.capitalize()} document written to {out}')
+            ctx = validate_document(doc, plan)
+            x_elements = list(DocumentView(ctx, doc['elements']))
+        ctx['index'].report()
+        if digests:
+            with open(digest_path, 'w', encoding='utf8') as fd:
+                write_digests(fd, explode_and_hash(x_elements, digests))
+        if graph:
+            graph.add(x_elements)
+        if store:
+            store.ingest(ctx['namespace'], path, x_elements)
+            references.append((name, ctx['index'].referenced))
+        make_dot(ctx, x_elements, os.path.join(OUT_DIR, name), args.cluster, args.cluster_threshold)
+        if args.edges:
+            write_edges(x_elements, os.path.join(OUT_DIR, name), args.edges)
         dump_elements(ctx, x_elements)
-        make_dot(ctx, x_elements, os.path.join(OUT_DIR, f.name))
+    if pool:
+        pool.shutdown()
+    if digests:
+        print(digests.summary())
+    if graph:
+        graph.report()
+    if store:
+        resolve_references(store, references)
+        print(store.summary())
+        store.close()
@@ -0,0 +1,235 @@
+"""
+Element ids and IRIs of SPDX v3 documents: index of defined and referenced ids, IRI locations
+compiled from the information model, and expansion and compression of IRIs
+
+Shared by check-elements and check-elements-map.
+"""
+import sys
+from collections import defaultdict
+from urllib.parse import urlparse
+
+IRI_TYPE = 'IRI'
+
+
+class DocumentIndex:
+    """
+    Hash indexes of the Element ids defined and referenced in a document
+
+    Ids are in the compact (local or prefix:local) form used in the document.  References that are
+    neither defined in the document nor listed in its documentRefs are collected for a single report.
+    """
+    def __init__(self, prefixes: dict = None):
+        self.prefixes = prefixes or {}          # prefix: namespace IRI
+        self.defined = {}                       # element id: position in document elements
+        self.referenced = defaultdict(set)      # namespace: local ids of elements in referenced documents
+        self.undefined = defaultdict(int)       # element id: number of references
+
+    def define(self, element_id: str, position: int) -> None:
+        self.defined.setdefault(element_id, position)
+
+    def reference(self, namespace: str, element_ids: list) -> None:
+        self.referenced[self.prefixes.get(namespace, namespace)].update(element_ids)
+
+    def shard(self) -> 'DocumentIndex':
+        """
+        Return an index of the same defined and referenced ids with no undefined references, to count those of a shard
+        """
+        index = DocumentIndex(self.prefixes)
+        index.defined, index.referenced = self.defined, self.referenced
+        return index
+
+    def check(self, element_id: str) -> bool:
+        """
+        Return True if element_id is defined or referenced by the document, otherwise record it as undefined
+        """
+        if element_id in self.defined:
+            return True
+        prefix, sep, local = element_id.partition(':')
+        if sep and local in self.referenced.get(self.prefixes.get(prefix, prefix), ()):
+            return True
+        self.undefined[element_id] += 1
+        return False
+
+    def report(self) -> None:
+        if self.undefined:
+            print(f'    Undefined Elements: {len(self.undefined)}')
+            for element_id, count in self.undefined.items():
+                print(f'      {element_id} ({count} reference{"s" if count > 1 else ""})')
+
+    def __repr__(self) -> str:
+        refs = sum(len(v) for v in self.referenced.values())
+        return f'DocumentIndex({len(self.defined)} defined, {refs} referenced, {len(self.undefined)} undefined)'
+
+
+def expand_iri(context: dict, element_id: str) -> str:
+    """
+    Convert an Element ID in namespace:local form to an IRI
+    """
+    if context:
+        u = urlparse(element_id)
+        if u.scheme:
+            if prefix := context['prefixes'].get(u.scheme, ''):
+                if index := context.get('index'):
+                    index.check(element_id)
+                return sys.intern(prefix + u.path)
+            return element_id
+        if index := context.get('index'):
+            index.check(element_id)
+        return sys.intern(context.get('namespace', '') + element_id)
+    return element_id
+
+
+class IriPlan:
+    """
+    Locations of IRI values in an Element, compiled once from the information model
+
+    Every field that is a Key or Link, or has the IRI type, is an IRI slot.  The plan is a tree
+    that follows only the Element fields and ElementType alternatives that contain IRI slots,
+    so rewriting an element touches only those slots and tests no other property names.
+    Node: ('record', [(field name, is list, child node or None for an IRI value)])
+          ('choice', {alternative name: child node or None})
+    """
+    def __init__(self, schema: dict, root: str = 'Element'):
+        self.types = {t[0]: t for t in schema['types']}
+        self.root = self._node(root, set())
+        del self.types
+
+    def _node(self, tname: str, active: set) -> (tuple, None):
+        if (td := self.types.get(tname)) is None or tname in active or td[1] not in ('Record', 'Map', 'Choice'):
+            return None
+        active.add(tname)
+        slots = []
+        for fd in td[4]:
+            fid, fname, ftype, fopts = fd[:4]
+            if ftype == IRI_TYPE or {'K', 'L'} & set(fopts):
+                slots.append((fname, self._is_list(fopts), None))
+            elif child := self._node(ftype, active):
+                slots.append((fname, self._is_list(fopts), child))
+        active.remove(tname)
+        if not slots:
+            return None
+        if td[1] == 'Choice':
+            return 'choice', {fname: child for fname, many, child in slots}
+        return 'record', slots
+
+    @classmethod
+    def from_tree(cls, root: tuple) -> 'IriPlan':
+        """
+        Create a plan from the tree of a previously compiled plan, e.g., loaded from the schema cache
+        """
+        plan = cls.__new__(cls)
+        plan.root = root
+        return plan
+
+    @staticmethod
+    def _is_list(fopts: list) -> bool:
+        return any(o.startswith(']') and o != ']1' for o in fopts)
+
+    def rewrite(self, element: dict, f: callable) -> None:
+        """
+        Replace each IRI value in element (in place) with f(IRI)
+        """
+        if self.root:
+            self._rewrite(self.root, element, f)
+
+    def _rewrite(self, node: tuple, value: dict, f: callable) -> None:
+        kind, slots = node
+        for name, many, child in (slots if kind == 'record' else ((k, False, slots[k]) for k in value if k in slots)):
+            if (v := value.get(name)) is None:
+                continue
+            if child:
+                for vx in (v if many else (v,)):
+                    self._rewrite(child, vx, f)
+            else:
+                value[name] = [f(k) for k in v] if many else f(v)
+
+    def rewritten(self, element: dict, f: callable) -> dict:
+        """
+        Return a copy of element with each IRI value replaced by f(IRI)
+
+        The dicts and lists that hold IRIs are copied, so element and the values it shares are not changed.
+        """
+        return self._rewritten(self.root, element, f) if self.root else dict(element)
+
+    def _rewritten(self, node: tuple, value: dict, f: callable) -> dict:
+        kind, slots = node
+        copied = dict(value)
+        for name, many, child in (slots if kind == 'record' else ((k, False, slots[k]) for k in value if k in slots)):
+            if (v := value.get(name)) is None:
+                continue
+            if child:
+                copied[name] = [self._rewritten(child, vx, f) for vx in v] if many else self._rewritten(child, v, f)
+            else:
+                copied[name] = [f(k) for k in v] if many else f(v)
+        return copied
+
+    def __repr__(self) -> str:
+        def _count(node: tuple) -> int:
+            slots = node[1] if node[0] == 'record' else [(k, False, v) for k, v in node[1].items()]
+            return sum(_count(child) if child else 1 for name, many, child in slots)
+        return f'IriPlan({_count(self.root) if self.root else 0} IRI slots)'
+
+
+class PrefixMatcher:
+    """
+    Character trie of namespace IRIs that replaces the longest namespace starting an IRI with its prefix
+
+    Correct when one namespace is a prefix of another, and does O(len(IRI)) work per IRI
+    regardless of the number of namespaces.
+    """
+    def __init__(self, namespace: str = '', prefixes: dict = None):
+        self.root = {}
+        self.size = 0
+        for prefix, uri in (prefixes or {}).items():
+            self._add(uri, prefix + ':')
+        self._add(namespace, '')            # Document namespace takes precedence over an identical prefix
+
+    def _add(self, uri: str, replacement: str) -> None:
+        if uri:
+            node = self.root
+            for c in uri:
+                node = node.setdefault(c, {})
+            self.size += None not in node
+            node[None] = replacement
+
+    def compress(self, iri: str) -> str:
+        node, end, replacement = self.root, 0, None
+        for n, c in enumerate(iri, start=1):
+            if (node := node.get(c)) is None:
+                break
+            if None in node:
+                end, replacement = n, node[None]
+        return iri if replacement is None else replacement + iri[end:]
+
+    def namespace(self, iri: str) -> str:
+        """
+        Return the longest namespace that starts an IRI, or '' if none does
+        """
+        node, end = self.root, 0
+        for n, c in enumerate(iri, start=1):
+            if (node := node.get(c)) is None:
+                break
+            if None in node:
+                end = n
+        return iri[:end]
+
+    def __repr__(self) -> str:
+        return f'PrefixMatcher({self.size} namespaces)'
+
+
+def prefix_matcher(context: dict) -> PrefixMatcher:
+    """
+    Return the PrefixMatcher compiled for a document context, or build one for an ad hoc context
+    """
+    if m := context.get('matcher'):
+        return m
+    return PrefixMatcher(context.get('namespace', ''), context.get('prefixes', {}))
+
+
+def compress_iri(context: dict, iri: str) -> str:
+    """
+    Convert an Element ID IRI to namespace:local form
+    """
+    if context:
+        return prefix_matcher(context).compress(iri)
+    return iri
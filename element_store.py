@@ -0,0 +1,230 @@
+"""
+Persistent store of expanded elements from many documents, used to resolve references between documents
+
+Run as a script to measure ingest and bulk resolution rates on a synthetic corpus.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict, defaultdict
+from itertools import islice
+from canonical import canonical_element
+
+STORE_PATH = os.path.join('.cache', 'elements.db')
+HOT_DOCUMENTS = 64              # Documents kept in memory by the LRU cache
+QUERY_BATCH = 500               # IRIs per bulk lookup query, below the SQLite parameter limit
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,       # 64 MB page cache
+    'wal_autocheckpoint': 10000,    # Pages written before a checkpoint, fewer checkpoints during ingest
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY,
+        namespace TEXT UNIQUE NOT NULL,
+        source TEXT
+    );
+    CREATE TABLE IF NOT EXISTS bodies (
+        id INTEGER PRIMARY KEY,
+        digest BLOB UNIQUE NOT NULL,
+        body BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS elements (
+        iri TEXT NOT NULL,
+        body INTEGER NOT NULL,
+        PRIMARY KEY (iri, body)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS members (
+        document INTEGER NOT NULL,
+        iri TEXT NOT NULL,
+        body INTEGER NOT NULL,
+        PRIMARY KEY (document, iri)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS members_body ON members (body, iri);
+"""
+
+
+class ElementStore:
+    """
+    SQLite store of expanded elements, de-duplicated by IRI and content hash
+
+    The body of each distinct element (canonical JSON) is stored once under its SHA-256 digest, so an
+    element copied into many documents costs one (IRI, digest) row plus one membership row per document.
+    Copies of an IRI with different content are kept and reported as conflicts.  All lookups are by
+    primary key, and rows are written in one transaction per document, so the store scales to tens of
+    millions of elements on one disk.  The elements of recently used documents are kept in an LRU cache,
+    because references to a document usually come from many documents in a row.  Resolved elements
+    are returned in their canonical JSON form.
+    """
+    def __init__(self, path: str = STORE_PATH, hot_documents: int = HOT_DOCUMENTS):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(''.join(f'PRAGMA {k} = {v};' for k, v in PRAGMAS.items()) + SCHEMA)
+        self.hot = OrderedDict()                # namespace: {IRI: element} of recently resolved documents
+        self.hot_documents = hot_documents
+        self.stats = defaultdict(int)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def ingest(self, namespace: str, source: str, elements_x: list, replace: bool = True) -> tuple:
+        """
+        Store the expanded elements of a document, replacing the elements stored for its namespace
+
+        Elements and bodies of the replaced document that no other document contains are deleted first,
+        in the same transaction, so a revised document does not conflict with its previous version.
+        :param replace: False to add elements to those already stored for the namespace, e.g. in batches
+        :return: (new elements, elements already stored, elements stored with different content)
+        """
+        rows = []
+        for element_x in elements_x:
+            body = canonical_element(element_x)
+            rows.append((element_x['id'], hashlib.sha256(body).digest(), body))
+        with self.db:
+            cur = self.db.execute('INSERT INTO documents (namespace, source) VALUES (?, ?) ON CONFLICT (namespace) '
+                                  'DO UPDATE SET source = excluded.source RETURNING id', (namespace, source))
+            doc_id = cur.fetchone()[0]
+            if replace:
+                old = self.db.execute('SELECT iri, body FROM members WHERE document = ?', (doc_id,)).fetchall()
+                self.db.execute('DELETE FROM members WHERE document = ?', (doc_id,))
+                self._drop_unreferenced(old)
+            body_ids = dict(self._select('SELECT digest, id FROM bodies WHERE digest IN ({})', [r[1] for r in rows]))
+            next_id = self.db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM bodies').fetchone()[0]
+            new_bodies = []
+            for _, digest, body in rows:        # Body ids are assigned here so bodies are appended in id order
+                if digest not in body_ids:
+                    body_ids[digest] = next_id + len(new_bodies)
+                    new_bodies.append((body_ids[digest], digest, body))
+            self.db.executemany('INSERT INTO bodies VALUES (?, ?, ?)', new_bodies)
+            known = defaultdict(set)
+            for iri, body_id in self._select('SELECT iri, body FROM elements WHERE iri IN ({})', [r[0] for r in rows]):
+                known[iri].add(body_id)
+            refs = [(iri, body_ids[digest]) for iri, digest, _ in rows]
+            new = sum(1 for iri, body_id in refs if iri not in known)
+            conflicts = sum(1 for iri, body_id in refs if known.get(iri, {body_id}) - {body_id})
+            self.db.executemany('INSERT OR IGNORE INTO elements VALUES (?, ?)', refs)
+            self.db.executemany('INSERT OR REPLACE INTO members VALUES (?, ?, ?)', ((doc_id, *r) for r in refs))
+        self.hot.pop(namespace, None)
+        self.stats['documents'] += replace
+        self.stats['new'] += new
+        self.stats['copies'] += len(rows) - new
+        self.stats['conflicts'] += conflicts
+        return new, len(rows) - new, conflicts
+
+    def _drop_unreferenced(self, refs: list) -> None:
+        """
+        Delete the elements and bodies of (IRI, body id) refs that are no longer members of any document
+        """
+        self.db.executemany('DELETE FROM elements WHERE iri = ? AND body = ? AND NOT EXISTS '
+                            '(SELECT 1 FROM members m WHERE m.body = elements.body AND m.iri = elements.iri)', refs)
+        self.db.executemany('DELETE FROM bodies WHERE id = ? AND NOT EXISTS '
+                            '(SELECT 1 FROM members m WHERE m.body = bodies.id)', ((b,) for b in {r[1] for r in refs}))
+
+    def _select(self, query: str, keys: list):
+        """
+        Generate the rows of a query with an IN ({}) list, for keys QUERY_BATCH at a time
+        """
+        it = iter(keys)
+        while chunk := list(islice(it, QUERY_BATCH)):
+            yield from self.db.execute(query.format(','.join('?' * len(chunk))), chunk)
+
+    def document(self, namespace: str) -> (dict, None):
+        """
+        Return {IRI: element} of a stored document from the LRU cache, loading it on a miss
+        """
+        if namespace in self.hot:
+            self.hot.move_to_end(namespace)
+            self.stats['hits'] += 1
+            return self.hot[namespace]
+        self.stats['misses'] += 1
+        if not (row := self.db.execute('SELECT id FROM documents WHERE namespace = ?', (namespace,)).fetchone()):
+            return None
+        elements = {iri: json.loads(body) for iri, body in self.db.execute(
+            'SELECT m.iri, b.body FROM members m JOIN bodies b ON b.id = m.body WHERE m.document = ?', row)}
+        self.hot[namespace] = elements
+        if len(self.hot) > self.hot_documents:
+            self.hot.popitem(last=False)
+        return elements
+
+    def lookup(self, iris: list) -> dict:
+        """
+        Return {IRI: [elements]} of elements with the given IRIs in any stored document, one per distinct content
+        """
+        found = defaultdict(list)
+        for iri, body in self._select('SELECT e.iri, b.body FROM elements e JOIN bodies b ON b.id = e.body '
+                                      'WHERE e.iri IN ({})', iris):
+            found[iri].append(json.loads(body))
+        return found
+
+    def resolve(self, referenced: dict) -> tuple:
+        """
+        Resolve the elements a document references in other documents, one namespace at a time
+
+        An element is taken from the stored document with the referenced namespace if there is one, and
+        otherwise from any stored copy with that IRI.
+        :param referenced: {namespace IRI: [local ids]}, as collected from documentRefs
+        :return: ({IRI: element} resolved, [IRIs not found], [IRIs with conflicting copies])
+        """
+        resolved, missing, conflicts = {}, [], []
+        for namespace, ids in referenced.items():
+            iris = [namespace + local for local in ids]
+            if (elements := self.document(namespace)) is not None:
+                resolved.update({iri: elements[iri] for iri in iris if iri in elements})
+                iris = [iri for iri in iris if iri not in elements]
+            for iri, copies in self.lookup(iris).items():
+                resolved[iri] = copies[0]
+                if len(copies) > 1:
+                    conflicts.append(iri)
+            missing += [iri for iri in iris if iri not in resolved]
+        self.stats['resolved'] += len(resolved)
+        self.stats['missing'] += len(missing)
+        return resolved, missing, conflicts
+
+    def summary(self) -> str:
+        st = self.stats
+        n_docs, n_elements, n_bodies = (self.db.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+                                        for t in ('documents', 'elements', 'bodies'))
+        return (f'Element store: {n_docs} documents, {n_elements} elements, {n_bodies} distinct bodies; '
+                f'ingested {st["documents"]} documents ({st["new"]} new, {st["copies"]} copies, '
+                f'{st["conflicts"]} conflicting), resolved {st["resolved"]}, missing {st["missing"]}, '
+                f'document cache {st["hits"]} hits, {st["misses"]} misses')
+
+
+def synthetic_document(n: int, size: int, copies: int) -> tuple:
+    """
+    Return (namespace, expanded elements) of a document that copies `copies` elements of document n - 1
+    """
+    ns = f'http://example.com/doc{n}/'
+    prev = f'http://example.com/doc{n - 1}/'
+    elements = [{'id': f'{ns}e{k}', 'type': {'file': {}}, 'name': f'file {k} of document {n}'} for k in range(size)]
+    elements += [{'id': f'{prev}e{k}', 'type': {'file': {}}, 'name': f'file {k} of document {n - 1}'}
+                 for k in range(copies)]
+    return ns, elements
+
+
+if __name__ == '__main__':
+    N_DOCUMENTS, SIZE, COPIES = 200, 5000, 50
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ElementStore(db_path := os.path.join(tmp, 'elements.db'))
+        start = time.perf_counter()
+        for n in range(N_DOCUMENTS):
+            namespace, elements = synthetic_document(n, SIZE, COPIES if n else 0)
+            store.ingest(namespace, f'doc{n}.json', elements)
+        sec = time.perf_counter() - start
+        total = N_DOCUMENTS * SIZE + (N_DOCUMENTS - 1) * COPIES
+        print(f'Ingest: {total} elements in {sec:.2f} sec, {total / sec:,.0f} elements/sec, '
+              f'{os.path.getsize(db_path) / 1e6:.1f} MB')
+        start = time.perf_counter()
+        for n in range(N_DOCUMENTS):    # Each document references 10% of the elements of one of 10 documents
+            store.resolve({f'http://example.com/doc{n % 10}/': [f'e{k}' for k in range(0, SIZE, 10)]})
+        sec = time.perf_counter() - start
+        print(f'Resolve: {N_DOCUMENTS * SIZE // 10} references in {sec:.2f} sec, '
+              f'{N_DOCUMENTS * SIZE // 10 / sec:,.0f} references/sec')
+        print(store.summary())
+        store.close()
@@ -0,0 +1,108 @@
+"""
+Streamed reading of large JSON documents and decoding of their top-level properties, shared by
+check-elements and spdx-2to3
+"""
+import jadn
+import json
+
+CHUNK_SIZE = 64 * 1024          # Characters read at a time when streaming documents
+
+
+class JsonStreamReader:
+    """
+    Incremental reader of a JSON object that yields the items of its array properties one at a time
+
+    Only the text of the current value is held in memory, so documents of any size are read in
+    constant memory as long as each array item and each other property is small.
+    """
+    def __init__(self, fp, chunk_size: int = CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _more(self) -> bool:
+        if not (data := self.fp.read(self.chunk_size)):
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def _next(self) -> str:
+        """
+        Consume and return the next non-whitespace character
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                self.pos += 1
+                return self.buf[self.pos - 1]
+            if not self._more():
+                raise ValueError('Unexpected end of JSON document')
+
+    def _expect(self, chars: str) -> str:
+        if (c := self._next()) not in chars:
+            raise ValueError(f'Invalid JSON document: expected "{chars}", found "{c}"')
+        return c
+
+    def _value(self):
+        self._next()                                    # Skip whitespace, then back up to start of value
+        self.pos -= 1
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or not self._more():     # A number could continue in the next chunk
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if not self._more():
+                    raise
+
+    def items(self, array_keys: tuple):
+        """
+        Generate (key, value) for each property of the object, and (key, item) for each item of array_keys
+        """
+        self._expect('{')
+        if self._next() == '}':
+            return
+        self.pos -= 1
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key not in array_keys:
+                yield key, self._value()
+            elif self._expect('[') and self._next() != ']':
+                self.pos -= 1
+                while True:
+                    yield key, self._value()
+                    if self._expect(',]') == ']':
+                        break
+            if self._expect(',}') == '}':
+                return
+
+
+def record_fields(schema: dict, datatype: str) -> dict:
+    return {f[1]: f for t in schema['types'] if t[0] == datatype for f in t[4]}
+
+
+def decode_properties(codec: jadn.codec.Codec, schema: dict, datatype: str, props: dict, streamed: tuple) -> dict:
+    """
+    Validate and decode the top-level properties of a document without its streamed arrays
+
+    :param streamed: fields of datatype read one item at a time, which are not required in props
+    """
+    fields = record_fields(schema, datatype)
+    values = {}
+    for k, v in props.items():
+        if k not in fields:
+            raise ValueError(f'{datatype}: unexpected field: {k}')
+        fid, fname, ftype, fopts = fields[k][:4]
+        if any(o.startswith(']') and o != ']1' for o in fopts):
+            values[k] = [codec.decode(ftype, x) for x in v]
+        else:
+            values[k] = codec.decode(ftype, v)
+    if missing := [f for f in fields if f not in props and f not in streamed and '[0' not in fields[f][3]]:
+        raise ValueError(f'{datatype}: missing required fields: {missing}')
+    return values
@@ -2,12 +2,35 @@
 Translate each schema file in Source directory to multiple formats in Out directory
 """
 import jadn
+import json
 import os
 import shutil
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 from typing import NoReturn
+from schema_cache import SchemaCache
 
 SCHEMA_DIR = 'Schemas'
 OUTPUT_DIR = 'Out'
+MANIFEST = os.path.join('.cache', 'artifacts.json')
+ARTIFACTS_VERSION = 1           # Change when the artifact list or dump options change
+
+
+def core_dump(schema: dict, fname: str) -> NoReturn:
+    jadn.dump(jadn.transform.unfold_extensions(jadn.transform.strip_comments(schema)), fname)
+
+
+ARTIFACTS = (       # (file suffix, dump function, options)
+    ('.jadn', jadn.dump, {}),
+    ('_core.jadn', core_dump, {}),
+    ('.dot', jadn.convert.dot_dump, {'style': {'links': True}}),
+    ('.puml', jadn.convert.plant_dump, {'style': {'links': True, 'detail': 'information'}}),
+    ('.jidl', jadn.convert.jidl_dump, {'style': {'desc': 50}}),
+    ('.html', jadn.convert.html_dump, {}),
+    ('.md', jadn.convert.table_dump, {}),
+    ('.json', jadn.translate.json_schema_dump, {}),
+)
 
 
 def load_any(path: str) -> (dict, None):
@@ -25,27 +48,90 @@ def load_any(path: str) -> (dict, None):
     return loader(path)
 
 
-def translate(filename: str, sdir: str, odir: str) -> NoReturn:
-    if not (schema := load_any(os.path.join(sdir, filename))):
-        return
-    print(f'{filename}:\n', '\n'.join([f'{k:>15}: {v}' for k, v in jadn.analyze(jadn.check(schema)).items()]))
+def load_manifest() -> dict:
+    """
+    Return {output path: build stamp} of the artifacts written by previous runs
+    """
+    try:
+        with open(MANIFEST, encoding='utf8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict) -> NoReturn:
+    os.makedirs(os.path.dirname(MANIFEST), exist_ok=True)
+    with open(MANIFEST, 'w', encoding='utf8') as fp:
+        json.dump(manifest, fp, indent=2)
+
+
+def make_artifact(dump: callable, schema: dict, fname: str, options: dict) -> str:
+    dump(schema, fname, **options)
+    return fname
+
+
+def translate(filename: str, sdir: str, odir: str, cache: SchemaCache, manifest: dict, force: bool = False) -> list:
+    """
+    Check a schema once and list the artifacts that are missing or were built from a different schema or jadn
+
+    :return: [(dump function, schema, output path, options, build stamp)] of artifacts to build
+    """
+    if not (entry := cache.load(path := os.path.join(sdir, filename), load_any)):
+        return []
+    print(f'{filename}:\n', '\n'.join([f'{k:>15}: {v}' for k, v in entry['analysis'].items()]))
 
     fn, ext = os.path.splitext(filename)
-    jadn.dump(schema, os.path.join(odir, fn + '.jadn'))
-    jadn.dump(jadn.transform.unfold_extensions(jadn.transform.strip_comments(schema)),
-              os.path.join(odir, fn + '_core.jadn'))
-    jadn.convert.dot_dump(schema, os.path.join(odir, fn + '.dot'), style={'links': True})
-    jadn.convert.plant_dump(schema, os.path.join(odir, fn + '.puml'), style={'links': True, 'detail': 'information'})
-    jadn.convert.jidl_dump(schema, os.path.join(odir, fn + '.jidl'), style={'desc': 50})
-    jadn.convert.html_dump(schema, os.path.join(odir, fn + '.html'))
-    jadn.convert.table_dump(schema, os.path.join(odir, fn + '.md'))
-    jadn.translate.json_schema_dump(schema, os.path.join(odir, fn + '.json'))
+    stamp = f'{cache.entries[path][0]}-{ARTIFACTS_VERSION}'      # Schema hash and jadn version
+    jobs = []
+    for suffix, dump, options in ARTIFACTS:
+        fname = os.path.join(odir, fn + suffix)
+        if force or manifest.get(fname) != stamp or not os.path.isfile(fname):
+            jobs.append((dump, entry['schema'], fname, options, stamp))
+    return jobs
+
+
+def build(jobs: list, manifest: dict, workers: int) -> list:
+    """
+    Run the dump functions of all stale artifacts in a pool of worker processes, recording each one built
+
+    An artifact that fails does not stop the others and is not recorded, so it is rebuilt by the next run.
+    :return: [(output path, error)] of the artifacts that failed
+    """
+    failed = []
+    with ProcessPoolExecutor(min(workers, len(jobs))) as pool:
+        futures = {pool.submit(make_artifact, dump, schema, fname, options): (fname, stamp)
+                   for dump, schema, fname, options, stamp in jobs}
+        for future, (fname, stamp) in futures.items():
+            try:
+                manifest[future.result()] = stamp
+            except Exception as e:
+                failed.append((fname, e))
+    return failed
 
 
 if __name__ == '__main__':
+    parser = ArgumentParser(description='Translate schemas to documentation formats and concrete schemas')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of processes used to write artifacts (default: number of CPUs)')
+    parser.add_argument('-f', '--force', action='store_true', help='rebuild artifacts that are up to date')
+    args = parser.parse_args()
     print(f'Installed JADN version: {jadn.__version__}\n')
     css_dir = os.path.join(OUTPUT_DIR, 'css')
     os.makedirs(css_dir, exist_ok=True)
     shutil.copy(os.path.join(jadn.data_dir(), 'dtheme.css'), css_dir)
-    for f in os.listdir(SCHEMA_DIR):
-        translate(f, SCHEMA_DIR, OUTPUT_DIR)
+    cache = SchemaCache()
+    manifest = load_manifest()
+    jobs = []
+    for f in sorted(os.listdir(SCHEMA_DIR)):
+        jobs += translate(f, SCHEMA_DIR, OUTPUT_DIR, cache, manifest, args.force)
+    failed = []
+    if jobs:
+        failed = build(jobs, manifest, args.jobs)
+        save_manifest(manifest)
+    for fname, e in failed:
+        print(f'{fname}: {type(e).__name__}: {e}')
+    print(f'{len(jobs) - len(failed)} artifacts written, {len(failed)} failed, '
+          f'{len(ARTIFACTS) * len(cache.entries) - len(jobs)} up to date')
+    print(cache.summary())
+    if failed:
+        sys.exit(1)
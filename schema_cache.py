@@ -0,0 +1,116 @@
+"""
+Persistent cache of checked JADN schemas, shared by the scripts that load information models
+
+Run as a script to measure cold (empty cache) and warm startup for each schema in the Schemas directory.
+"""
+import hashlib
+import jadn
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+SCHEMA_DIR = 'Schemas'
+CACHE_DIR = os.path.join('.cache', 'schemas')
+CACHE_VERSION = 1
+
+
+class SchemaCache:
+    """
+    On-disk cache of checked schemas and of structures compiled from them
+
+    Entries are keyed by the SHA-256 of the schema file, the installed jadn version and the cache
+    version, so a schema is parsed, checked and analyzed again only when one of those changes.
+    Scripts store their own compiled structures (which must be JSON-serializable) in the same entry
+    with derived().  A jadn Codec holds closures that cannot be serialized and is built at each start.
+    """
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.entries = {}                   # schema path: (key, entry) loaded by this process
+        self.stats = defaultdict(float)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _read(self, key: str) -> (dict, None):
+        try:
+            with open(self._path(key), encoding='utf8') as fx:
+                return json.load(fx)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key: str, entry: dict) -> None:
+        tmp = self._path(key) + f'.{os.getpid()}'
+        with open(tmp, 'w', encoding='utf8') as fx:
+            json.dump(entry, fx)
+        os.replace(tmp, self._path(key))    # Concurrent processes never see a partial entry
+
+    @staticmethod
+    def key(path: str) -> str:
+        with open(path, 'rb') as fx:
+            sha = hashlib.sha256(fx.read()).hexdigest()
+        return f'{sha}-{jadn.__version__}-{CACHE_VERSION}'
+
+    def load(self, path: str, loader: callable) -> (dict, None):
+        """
+        Return the cached {schema, analysis, derived} entry for a schema file, loading and checking it on a miss
+
+        :param loader: function that reads the schema file, returning None if it is not a schema
+        """
+        start = time.perf_counter()
+        if not os.path.isfile(path):
+            return None
+        key = self.key(path)
+        if entry := self._read(key):
+            self.stats['hits'] += 1
+        else:
+            if (schema := loader(path)) is None:
+                return None
+            schema = jadn.check(schema)
+            entry = {'schema': schema, 'analysis': jadn.analyze(schema), 'derived': {}}
+            self._write(key, entry)
+            self.stats['misses'] += 1
+        self.entries[path] = key, entry
+        self.stats['seconds'] += time.perf_counter() - start
+        return entry
+
+    def derived(self, path: str, name: str, build: callable):
+        """
+        Return a structure compiled from a loaded schema, building it with build(schema) if it is not cached
+        """
+        key, entry = self.entries[path]
+        if name not in entry['derived']:
+            entry['derived'][name] = build(entry['schema'])
+            self._write(key, entry)
+            self.stats['derived'] += 1
+        return entry['derived'][name]
+
+    def summary(self) -> str:
+        st = self.stats
+        return (f'Schema cache: {st["hits"]:.0f} hits, {st["misses"]:.0f} misses, '
+                f'{st["derived"]:.0f} structures compiled, {1000 * st["seconds"]:.1f} ms')
+
+
+def startup(cache: SchemaCache, path: str) -> tuple:
+    """
+    Return the seconds to load a schema through cache and to build its Codec
+    """
+    start = time.perf_counter()
+    entry = cache.load(path, jadn.convert.jidl_load)
+    loaded = time.perf_counter()
+    jadn.codec.Codec(entry['schema'], verbose_rec=True, verbose_str=True)
+    return loaded - start, time.perf_counter() - loaded
+
+
+if __name__ == '__main__':
+    print(f'Installed JADN version: {jadn.__version__}\n')
+    with tempfile.TemporaryDirectory() as tmp:
+        for f in sorted(os.listdir(SCHEMA_DIR)):
+            if os.path.splitext(f)[1] != '.jidl':
+                continue
+            cache = SchemaCache(os.path.join(tmp, f))
+            (cold, c_codec), (warm, w_codec) = startup(cache, p := os.path.join(SCHEMA_DIR, f)), startup(cache, p)
+            print(f'{f:>18}: cold {1000 * cold:7.2f} ms, warm {1000 * warm:6.2f} ms ({cold / warm:.1f}x), '
+                  f'Codec {1000 * (c_codec + w_codec) / 2:6.2f} ms')
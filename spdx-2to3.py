@@ -2,11 +2,22 @@
 Translate SPDX v2.2 JSON files to SPDX v3
 """
 
+import gzip
 import jadn
 import json
 import os
 import re
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import redirect_stdout
 from datetime import datetime, timezone
+from io import StringIO
+from itertools import islice
+from json_stream import JsonStreamReader, decode_properties, record_fields
+from schema_cache import SchemaCache
+from transfer_format import FORMATS, FormatCodecs, record_value
 
 SPDX_V2_SCHEMA = 'spdx-v2_2.jidl'
 SPDX_V3_SCHEMA = 'spdx-v3.jidl'
@@ -14,6 +25,32 @@ DATA_DIR = 'Data2'
 SCHEMA_DIR = 'Schemas'
 OUTPUT_DIR = 'Out'
 
+V2_DOCUMENT = 'Document'
+V3_DOCUMENT = 'TransferUnit'
+V3_ELEMENT = 'Element'
+V2_ARRAYS = ('packages', 'files', 'snippets', 'relationships', 'annotations')   # Streamed one item at a time
+SPEC_VERSION = '3.0'
+PROFILES = ['Core', 'Software']
+NO_VALUE = ('NONE', 'NOASSERTION')
+HASH_ALGORITHMS = {'MD5': 'md5', 'SHA1': 'sha1', 'SHA256': 'sha256'}    # v2 algorithms with a v3 Hashes field
+FILE_PURPOSE = {
+    'SOURCE': 'SOURCE',
+    'BINARY': 'EXECUTABLE',
+    'ARCHIVE': 'ARCHIVE',
+    'APPLICATION': 'APPLICATION',
+    'DOCUMENTATION': 'DOCUMENTATION',
+    'OTHER': 'OTHER'
+}
+ENTITY = re.compile(r'^\s*(Person|Organization|Tool)\s*:\s*(.*?)\s*(?:\(([^()]*)\))?\s*$')
+MAX_PREFIX = 16                 # v3 Prefix = String{1..16}
+SEPARATORS = (',', ':')         # Outputs are not pretty-printed
+COMPRESS_LEVEL = 6              # gzip level of --compress outputs, faster than the default 9
+MANIFEST = os.path.join('.cache', 'spdx-2to3.jsonl')
+JOB_QUEUE = 4                   # Documents queued per worker process
+ELEMENTS = '\0elements\0'        # Placeholder for the elements of a TransferUnit record while it is written
+
+_worker = {}        # Per-process state of --jobs processes
+
 
 def int2datems(dt: int) -> str:
     y = datetime.isoformat(datetime.fromtimestamp(dt/1000., timezone.utc))
@@ -27,7 +64,7 @@ def datems2int(dts: str) -> int:
     return int(1000 * datetime.timestamp(x))
 
 
-def load_schema(filename: str) -> dict:
+def load_schema(filename: str, cache: SchemaCache) -> dict:
     fname, ext = os.path.splitext(filename)
     try:
         loader = {
@@ -40,55 +77,504 @@ def load_schema(filename: str) -> dict:
         return {}
 
     print(f'{filename:}:')
-    schema = loader(os.path.join(SCHEMA_DIR, filename))
-    print('\n'.join([f'{k:>15}: {v}' for k, v in jadn.analyze(jadn.check(schema)).items()]) + '\n')
-    return schema
+    entry = cache.load(os.path.join(SCHEMA_DIR, filename), loader)
+    print('\n'.join([f'{k:>15}: {v}' for k, v in entry['analysis'].items()]) + '\n')
+    return entry['schema']
 
 
-def translate_2to3(v2doc: dict, verbose_id=False) -> dict:
-    element = {
-        'id': v2doc['SPDXID'],      # Get actual ID of SBOM Element.  (not SPDXRef-DOCUMENT)
-        'type': {
-            'sbom': {}
-        },
-        'name': v2doc.get('name', ''),      # Do not populate if empty
-        'summary': v2doc.get('summary', ''),
-        'description': v2doc.get('description', ''),
-        'comment': v2doc.get('comment', ''),
-        # verifiedUsing
-        # 'externalReferences': v2doc['externalDocumentRefs']
-        # 'extension': no spdx2 equivalent
-        # creationInfo comment: no spdx3 equivalent
-    }
-    document_context = {
-        'specVersion': v2doc['spdxVersion'],
+def encode_properties(codec: jadn.codec.Codec, schema: dict, props: dict) -> dict:
+    """
+    Validate and encode the properties of a v3 TransferUnit without its elements
+    """
+    fields = record_fields(schema, V3_DOCUMENT)
+    values = {}
+    for k, v in props.items():
+        fid, fname, ftype, fopts = fields[k][:4]
+        if any(o.startswith(']') and o != ']1' for o in fopts):
+            values[k] = [codec.encode(ftype, x) for x in v]
+        else:
+            values[k] = codec.encode(ftype, v)
+    return values
+
+
+def max_elements(schema: dict) -> int:
+    return schema['info'].get('config', {}).get('$MaxElements', jadn.definitions.DEFAULT_CONFIG['$MaxElements'])
+
+
+def integrity(checksums: list) -> dict:
+    """
+    Return the v3 verifiedUsing value of v2 checksums, dropping algorithms that v3 Hashes does not define
+    """
+    hashes = {HASH_ALGORITHMS[c['algorithm']]: c['checksumValue']
+              for c in checksums if c['algorithm'] in HASH_ALGORITHMS}
+    return {'hashes': hashes} if hashes else {}
+
+
+class IdentityTable:
+    """
+    Interning table of the v2 Entity strings used as creators, annotators and originators
+
+    Each distinct entity ("Tool: name", "Organization: name (email)", "Person: name (email)") becomes one
+    identity Element the first time it is seen, and every later use is a Link to that Element.  Elements
+    are created with sequential ids in order of first use, so the same v2 document always converts to the
+    same ids.  Only the table of entity strings is held in memory; new identity Elements are taken with
+    pending() as they are created.
+    """
+    def __init__(self, prefix: str = 'SPDXRef-Identity-'):
+        self.prefix = prefix
+        self.ids = {}                           # (kind, name, email): identity element id
+        self.new = []                           # identity Elements not yet taken
+
+    def intern(self, entity: str) -> str:
+        if not (m := ENTITY.match(entity)):
+            raise ValueError(f'Entity is not a Person, Organization or Tool: "{entity}"')
+        kind, name, email = m.group(1).lower(), m.group(2), (m.group(3) or '').strip()
+        if (key := (kind, name, email)) not in self.ids:
+            self.ids[key] = eid = f'{self.prefix}{len(self.ids) + 1}'
+            identity = {'type': {kind: {'userAgent': name} if kind == 'tool' else {}}}
+            if email:
+                identity['email'] = email
+            self.new.append({'id': eid, 'type': {'identity': identity}, 'name': name})
+        return self.ids[key]
+
+    def pending(self) -> list:
+        new, self.new = self.new, []
+        return new
+
+
+class Translation:
+    """
+    State shared by the element converters of one v2 document
+
+    Generated relationship and annotation ids are numbered per document.  References to elements in
+    external documents ("DocumentRef-x:SPDXRef-y") are translated to v3 prefixed ids using the prefixes
+    of the TransferUnit namespaceMap.
+    """
+    def __init__(self, doc_id: str, prefixes: dict, max_links: int):
+        self.doc_id = doc_id
+        self.prefixes = prefixes                # v2 DocumentRef id: v3 prefix
+        self.max_links = max_links
+        self.identities = IdentityTable()
+        self.serial = defaultdict(int)          # Last generated id number by element type
+        self.counts = defaultdict(int)          # Skipped items and errors
+
+    def link(self, ref: str) -> str:
+        if ':' not in ref:
+            return ref
+        docref, local = ref.split(':', maxsplit=1)
+        if docref not in self.prefixes:
+            raise ValueError(f'Reference to undefined external document: {ref}')
+        return f'{self.prefixes[docref]}:{local}'
+
+    def relationship(self, rtype: str, from_id: str, to_ids: list, comment: str = '') -> dict:
+        self.serial['relationship'] += 1
+        element = {
+            'id': f'SPDXRef-Relationship-{self.serial["relationship"]}',
+            'type': {'relationship': {'type': rtype, 'from': self.link(from_id), 'to': [self.link(t) for t in to_ids]}}
+        }
+        if comment:
+            element['comment'] = comment
+        return element
+
+    def contains(self, from_id: str, to_ids: list):
+        """
+        Generate CONTAINS relationships, each with at most max_links targets
+        """
+        for n in range(0, len(to_ids), self.max_links):
+            yield self.relationship('CONTAINS', from_id, to_ids[n:n + self.max_links])
+
+    def annotations(self, subject: str, annotations: list):
+        for a in annotations:
+            self.serial['annotation'] += 1
+            yield {
+                'id': f'SPDXRef-Annotation-{self.serial["annotation"]}',
+                'type': {'annotation': {'type': a['annotationType'], 'subject': subject, 'statement': a['comment']}},
+                'created': {
+                    'by': [self.identities.intern(a['annotator'])],
+                    'when': int2datems(datems2int(a['annotationDate']))
+                }
+            }
+
+
+def artifact(v2item: dict, name: str, element_type: dict) -> dict:
+    element = {'id': v2item['SPDXID'], 'type': element_type}
+    if name:                                    # Do not populate if empty
+        element['name'] = name
+    element.update({k: v2item[k] for k in ('summary', 'description', 'comment') if v2item.get(k)})
+    return element
+
+
+def package_elements(pkg: dict, tr: Translation):
+    package = {}
+    if (location := pkg.get('downloadLocation', 'NONE')) not in NO_VALUE:
+        package['artifactUri'] = [location]
+    if (originator := pkg.get('originator', 'NONE')) not in NO_VALUE:
+        package['originator'] = [tr.identities.intern(originator)]
+    if verified := integrity(pkg.get('checksums', [])):
+        package['verifiedUsing'] = verified
+    # versionInfo, packageFileName, supplier, homepage, licenses, copyrightText, externalRefs: no v3 property yet
+    yield artifact(pkg, pkg['name'], {'package': package})
+    yield from tr.contains(pkg['SPDXID'], pkg.get('hasFiles', []))
+    yield from tr.annotations(pkg['SPDXID'], pkg.get('annotations', []))
+
+
+def file_elements(file: dict, tr: Translation):
+    purpose = {FILE_PURPOSE[t]: None for t in file.get('fileTypes', []) if t in FILE_PURPOSE}
+    file3 = {'filePurpose': list(purpose)} if purpose else {}
+    if verified := integrity(file.get('checksums', [])):
+        file3['verifiedUsing'] = verified
+    # licenses, copyrightText, fileContributors, noticeText: no v3 property yet
+    yield artifact(file, file['fileName'], {'file': file3})
+    yield from tr.annotations(file['SPDXID'], file.get('annotations', []))
+
+
+def snippet_elements(snippet: dict, tr: Translation):
+    # ranges: SnippetLocation has no properties yet
+    yield artifact(snippet, snippet.get('name', ''), {'snippet': {'location': {}}})
+    yield from tr.contains(snippet['snippetFromFile'], [snippet['SPDXID']])
+    yield from tr.annotations(snippet['SPDXID'], snippet.get('annotations', []))
+
+
+def relationship_elements(rel: dict, tr: Translation):
+    if rel['relatedSpdxElement'] in NO_VALUE:   # v3 relationships have at least one target element
+        tr.counts['skipped relationships to NONE/NOASSERTION'] += 1
+        return
+    yield tr.relationship(rel['relationshipType'], rel['spdxElementId'], [rel['relatedSpdxElement']],
+                          rel.get('comment', ''))
+
+
+def annotation_elements(annotation: dict, tr: Translation):
+    yield from tr.annotations(tr.doc_id, [annotation])
+
+
+CONVERTERS = {
+    'packages': package_elements,
+    'files': file_elements,
+    'snippets': snippet_elements,
+    'relationships': relationship_elements,
+    'annotations': annotation_elements
+}
+
+
+def scan_v2(path: str) -> tuple:
+    """
+    First pass: read the properties of a v2 document, which may follow its arrays, and the element
+    references that cannot be found in the properties
+
+    :return: (document properties, [described element ids], {DocumentRef id: {referenced element ids}})
+    """
+    props, described, external = {}, {}, defaultdict(dict)
+    with open(path, encoding='utf8') as fp:
+        for k, v in JsonStreamReader(fp).items(V2_ARRAYS):
+            if k == 'relationships':
+                for ref in (v.get('spdxElementId', ''), v.get('relatedSpdxElement', '')):
+                    if ':' in ref:
+                        docref, local = ref.split(':', maxsplit=1)
+                        external[docref][local] = None
+                if v.get('relationshipType') == 'DESCRIBES' and v.get('spdxElementId') == props.get('SPDXID'):
+                    described[v.get('relatedSpdxElement')] = None
+            elif k not in V2_ARRAYS:
+                props[k] = v
+    described.update({d: None for d in props.get('documentDescribes', [])})
+    return props, [d for d in described if d not in NO_VALUE], external
+
+
+def document_header(props: dict, external: dict, tr: Translation) -> dict:
+    """
+    Return the properties of the TransferUnit: document namespace and defaults shared by all elements
+    """
+    header = {
+        'namespace': props['documentNamespace'] + '#',
+        'specVersion': SPEC_VERSION,
         'created': {
-            'by': v2doc['creationInfo']['creators'],
-            'when': int2datems(datems2int(v2doc['creationInfo']['created'])),   # Serialize epoch or string?
+            'by': [tr.identities.intern(c) for c in props['creationInfo']['creators']],
+            'when': int2datems(datems2int(props['creationInfo']['created'])),
         },
-        'profiles': ['Core'],
-        'dataLicense': v2doc['dataLicense'],
-        'namespace': v2doc['documentNamespace']
+        'profiles': PROFILES,
+        'dataLicense': props['dataLicense'],
+        # creationInfo comment: no spdx3 equivalent
     }
-    artifacts, identities, relationships, annotations = [], [], [], []      # Add elementValues and elementRefs to document_context
+    refs = {r['externalDocumentId']: r for r in props.get('externalDocumentRefs', [])}
+    if undefined := set(external) - set(refs):
+        raise ValueError(f'References to undefined external documents: {sorted(undefined)}')
+    if external:
+        header['documentRefs'] = [{
+            'namespace': tr.prefixes[docref],
+            'elements': list(elements),
+            'verifiedUsing': integrity([refs[docref]['checksum']])
+        } for docref, elements in external.items()]
+        header['namespaceMap'] = {refs[docref]['spdxDocument'] + '#': tr.prefixes[docref] for docref in external}
+    return header
 
-    element.update({'context': document_context})       # Use pseudo-property serialization
-    # return [element, document_context]                # use ContextElement serialization
-    return element
+
+def translate_2to3(path: str, codec2: jadn.codec.Codec, schema2: dict, max_links: int) -> tuple:
+    """
+    Convert a v2 document to v3 TransferUnit properties and a generator of v3 elements
+
+    The document is read twice, holding one array item at a time in memory: the first pass reads document
+    properties and external references, the second converts each package, file, snippet, relationship and
+    annotation to v3 elements as it is read.  Identity elements are generated when an entity is first seen.
+    :return: (TransferUnit properties, element generator, Translation)
+    """
+    props, described, external = scan_v2(path)
+    props = decode_properties(codec2, schema2, V2_DOCUMENT, props, V2_ARRAYS)
+    prefixes = {}
+    for n, r in enumerate(props.get('externalDocumentRefs', []), start=1):
+        p = r['externalDocumentId'].removeprefix('DocumentRef-')
+        prefixes[r['externalDocumentId']] = p if len(p) <= MAX_PREFIX else f'ref{n}'
+    tr = Translation(props['SPDXID'], prefixes, max_links)
+    header = document_header(props, external, tr)
+    types = {f[1]: f[2] for f in record_fields(schema2, V2_DOCUMENT).values()}
+
+    def elements():
+        # The SBOM lists the described (root) elements; all other elements are members through CONTAINS
+        yield artifact(props, props.get('name', ''),
+                       {'sbom': {'elements': [tr.link(d) for d in described], 'rootElements': [tr.link(d) for d in described]}})
+        yield from tr.identities.pending()
+        with open(path, encoding='utf8') as fp:
+            for n, (k, v) in enumerate(JsonStreamReader(fp).items(V2_ARRAYS)):
+                if k in V2_ARRAYS:
+                    try:
+                        converted = list(CONVERTERS[k](codec2.decode(types[k], v), tr))
+                    except ValueError as e:
+                        print(f'  {k} {v.get("SPDXID", n)}: {e}')
+                        tr.counts['v2 errors'] += 1
+                        continue
+                    yield from tr.identities.pending()     # Identities before the elements that use them
+                    yield from converted
+    return header, elements(), tr
+
+
+def write_transfer_unit(fo, header: (dict, list), elements_x) -> None:
+    """
+    Write a TransferUnit with elements written as they are generated, one per line
+
+    :param header: encoded TransferUnit record, an object or an array, with ELEMENTS in place of its elements
+    """
+    before, after = json.dumps(header, separators=SEPARATORS).split(json.dumps(ELEMENTS))
+    fo.write(before + '[')
+    sep = '\n'
+    for element_x in elements_x:
+        fo.write(sep + json.dumps(element_x, separators=SEPARATORS))
+        sep = ',\n'
+    fo.write('\n]' + after + '\n')
+
+
+def write_jsonl(fo, header: (dict, list), elements_x) -> None:
+    """
+    Write TransferUnit properties on the first line, then one element per line
+
+    The first line is the header record without elements, or with no elements if the record is an array.
+    """
+    if isinstance(header, dict):
+        header = {k: v for k, v in header.items() if v != ELEMENTS}
+    else:
+        header = [[] if v == ELEMENTS else v for v in header]
+    fo.write(json.dumps(header, separators=SEPARATORS) + '\n')
+    for element_x in elements_x:
+        fo.write(json.dumps(element_x, separators=SEPARATORS) + '\n')
+
+
+WRITERS = {
+    'transferunit': ('_v3.json', write_transfer_unit),
+    'jsonl': ('_v3.jsonl', write_jsonl)
+}
+
+
+def convert(path: str, out_path: str, writer: callable, codec2: jadn.codec.Codec, schema2: dict,
+            codec3: jadn.codec.Codec, schema3: dict, encoding: str = 'verbose') -> tuple:
+    """
+    Convert a v2 document file to a v3 file, validating each v3 element as it is written
+
+    The v3 output is in the transfer_format encoding of codec3.  Output paths ending in .gz are written
+    with gzip compression.
+    :return: ({element type: number written}, {skipped item or error: number})
+    """
+    header, elements, tr = translate_2to3(path, codec2, schema2, max_elements(schema3))
+    written = defaultdict(int)
+
+    def encoded():
+        for element in elements:
+            try:
+                element_x = codec3.encode(V3_ELEMENT, element)
+            except ValueError as e:
+                print(f'  {element["id"]}: {e}')
+                tr.counts['v3 errors'] += 1
+                continue
+            written[next(iter(element['type']))] += 1
+            yield element_x
+
+    header_x = record_value(record_fields(schema3, V3_DOCUMENT),
+                            {**encode_properties(codec3, schema3, header), 'elements': ELEMENTS}, encoding)
+    if out_path.endswith('.gz'):
+        fo = gzip.open(out_path, 'wt', encoding='utf8', compresslevel=COMPRESS_LEVEL)
+    else:
+        fo = open(out_path, 'w', encoding='utf8')
+    with fo:
+        writer(fo, header_x, encoded())
+    return dict(written), dict(tr.counts)
+
+
+def init_worker(schema2: dict, schema3: dict, encoding: str = 'verbose') -> None:
+    """
+    Build the Codecs of a worker process once, for all documents it converts
+
+    v2 documents are read as verbose JSON and v3 outputs are written in encoding.
+    """
+    _worker['schemas'] = schema2, schema3
+    _worker['codecs'] = FormatCodecs(schema2)['verbose'], FormatCodecs(schema3)[encoding]
+    _worker['encoding'] = encoding
+
+
+def convert_file(path: str, out_path: str, fmt: str) -> tuple:
+    """
+    Convert one document using the Codecs of this worker, capturing its messages
+
+    :return: (path, element counts or None if the document could not be converted, other counts, messages, seconds)
+    """
+    (schema2, schema3), (codec2, codec3) = _worker['schemas'], _worker['codecs']
+    start = time.perf_counter()
+    written, counts = None, {}
+    with redirect_stdout(log := StringIO()):
+        try:
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            written, counts = convert(path, out_path, WRITERS[fmt][1], codec2, schema2, codec3, schema3,
+                                      _worker['encoding'])
+        except (OSError, ValueError) as e:
+            print(f'  {e}')
+    return path, written, counts, log.getvalue(), time.perf_counter() - start
+
+
+def document_paths(paths: list, out_dir: str, suffix: str) -> list:
+    """
+    List (v2 document, v3 output) paths, replacing each directory in paths by the .json files under it
+
+    Outputs of documents found under a directory keep their path relative to that directory.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted((os.path.join(d, f), os.path.relpath(os.path.join(d, f), path))
+                            for d, _, fs in os.walk(path) for f in fs if os.path.splitext(f)[1] == '.json')
+        else:
+            files.append((path, os.path.basename(path)))
+    return [(p, os.path.join(out_dir, os.path.splitext(rel)[0] + suffix)) for p, rel in files]
+
+
+def stamp(path: str, out_path: str) -> str:
+    st = os.stat(path)
+    return f'{st.st_size}-{st.st_mtime_ns}-{out_path}'
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    Return {v2 document path: stamp} of the documents converted by previous runs
+
+    The manifest has one JSON line per converted document, appended as each conversion completes, so a
+    run that is interrupted resumes after the last document it finished.
+    """
+    manifest = {}
+    try:
+        with open(manifest_path, encoding='utf8') as fp:
+            for line in fp:
+                try:
+                    path, st = json.loads(line)
+                    manifest[path] = st
+                except ValueError:          # Line cut short by an interrupted run
+                    pass
+    except OSError:
+        pass
+    return manifest
+
+
+def run_jobs(pool: (ProcessPoolExecutor, None), jobs: list, fmt: str, window: int):
+    """
+    Generate convert_file results as documents complete, with at most window documents queued in the pool
+    """
+    if pool is None:
+        yield from (convert_file(path, out_path, fmt) for path, out_path in jobs)
+        return
+    pending, jobs = set(), iter(jobs)
+    while True:
+        for path, out_path in islice(jobs, window - len(pending)):
+            pending.add(pool.submit(convert_file, path, out_path, fmt))
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        yield from (f.result() for f in done)
+
+
+def convert_batch(pool: (ProcessPoolExecutor, None), jobs: list, fmt: str, window: int, mp) -> dict:
+    """
+    Convert documents, printing per-document throughput and recording each converted document in manifest mp
+    """
+    totals = defaultdict(float)
+    start = time.perf_counter()
+    stamps = {path: stamp(path, out_path) for path, out_path in jobs}
+    for path, written, counts, log, sec in run_jobs(pool, jobs, fmt, window):
+        size = os.path.getsize(path)
+        print(f'{path}:\n{log}', end='')
+        if written is None:
+            totals['failed'] += 1
+            continue
+        n = sum(written.values())
+        print(f'  {n} elements, {size / 1e6:.2f} MB in {sec:.2f} sec ({n / (sec or 1e-9):.0f} elements/sec): '
+              + ', '.join(f'{v} {k}' for k, v in {**written, **counts}.items()))
+        mp.write(json.dumps([path, stamps[path]]) + '\n')
+        mp.flush()
+        totals['documents'] += 1
+        totals['elements'] += n
+        totals['bytes'] += size
+        for k, v in counts.items():
+            totals[k] += v
+    totals['seconds'] = time.perf_counter() - start
+    return totals
+
+
+def batch_summary(totals: dict, skipped: int) -> str:
+    sec = totals['seconds'] or 1e-9
+    other = ''.join(f', {v:.0f} {k}' for k, v in totals.items()
+                    if k not in ('documents', 'failed', 'elements', 'bytes', 'seconds'))
+    return (f'{totals["documents"]:.0f} documents converted, {totals["failed"]:.0f} failed, {skipped} up to date, '
+            f'{totals["elements"]:.0f} elements{other}, {totals["bytes"] / 1e6:.2f} MB in {sec:.2f} sec\n'
+            f'{totals["documents"] / sec:.1f} documents/sec, {totals["elements"] / sec:.0f} elements/sec, '
+            f'{totals["bytes"] / 1e6 / sec:.2f} MB/sec')
 
 
 if __name__ == '__main__':
+    parser = ArgumentParser(description='Convert SPDX v2.2 JSON documents to SPDX v3, one element at a time',
+                            fromfile_prefix_chars='@')
+    parser.add_argument('paths', nargs='*', default=[DATA_DIR],
+                        help=f'v2 documents and directories of documents to convert (default: {DATA_DIR}), '
+                             f'@FILE reads paths from FILE, one per line')
+    parser.add_argument('--format', choices=tuple(WRITERS), default='transferunit',
+                        help='write a TransferUnit (default) or TransferUnit properties and elements as JSON lines')
+    parser.add_argument('-e', '--encoding', choices=tuple(FORMATS), default='verbose',
+                        help='JSON encoding of v3 outputs: verbose (default), compact (records as arrays) '
+                             'or concise (also integer field ids and enumerated values)')
+    parser.add_argument('-z', '--compress', action='store_true', help='write gzip-compressed outputs')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='convert documents in N processes')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='convert documents that are recorded as converted in the manifest')
+    parser.add_argument('--manifest', default=MANIFEST, help=f'record of converted documents (default: {MANIFEST})')
+    args = parser.parse_args()
     print(f'Installed JADN version: {jadn.__version__}\n')
-    codec2 = jadn.codec.Codec(load_schema(SPDX_V2_SCHEMA), verbose_rec=True, verbose_str=True)
-    codec3 = jadn.codec.Codec(load_schema(SPDX_V3_SCHEMA), verbose_rec=True, verbose_str=True)
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    for fx in os.listdir(DATA_DIR):
-        fn, ext = os.path.splitext(fx)
-        if ext == '.json':
-            print(f'{fx}:')
-            d2 = json.load(open(os.path.join(DATA_DIR, fx), 'r'))
-            doc2 = codec2.decode('Document', d2)
-            doc3 = translate_2to3(doc2)
-            d3 = codec3.encode('Element', doc3)
-            with open(os.path.join(OUTPUT_DIR, fn + '_v3.json'), 'w') as fo:
-                json.dump(d3, fo, indent=2)
+    cache = SchemaCache()
+    schema2, schema3 = load_schema(SPDX_V2_SCHEMA, cache), load_schema(SPDX_V3_SCHEMA, cache)
+    print(cache.summary())
+
+    root, ext = os.path.splitext(WRITERS[args.format][0])
+    suffix = (root if args.encoding == 'verbose' else f'{root}.{args.encoding}') + ext + ('.gz' if args.compress else '')
+    manifest = {} if args.force else load_manifest(args.manifest)
+    files = document_paths(args.paths, OUTPUT_DIR, suffix)
+    jobs = [(p, o) for p, o in files if manifest.get(p) != stamp(p, o) or not os.path.isfile(o)]
+    if os.path.dirname(args.manifest):
+        os.makedirs(os.path.dirname(args.manifest), exist_ok=True)
+    with open(args.manifest, 'a', encoding='utf8') as mp:
+        if args.jobs > 1:
+            with ProcessPoolExecutor(args.jobs, initializer=init_worker, initargs=(schema2, schema3, args.encoding)) as pool:
+                totals = convert_batch(pool, jobs, args.format, JOB_QUEUE * args.jobs, mp)
+        else:
+            init_worker(schema2, schema3, args.encoding)
+            totals = convert_batch(None, jobs, args.format, 1, mp)
+    print(batch_summary(totals, len(files) - len(jobs)))
@@ -1,10 +1,16 @@
+import hashlib
 import jadn
 import json
 import os
 import re
-from collections import defaultdict
-from io import TextIOWrapper
-from typing import TextIO
+import tarfile
+import time
+import zipfile
+from argparse import ArgumentParser
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO, TextIOWrapper
+from typing import NamedTuple, TextIO
 from urllib.request import urlopen, Request
 from urllib.parse import urlparse
 from urllib.error import HTTPError
@@ -15,12 +21,24 @@ Generate JADN information model and JSON serialization from SPDXv3 template file
 
 TEMPLATE_ROOT_DIR = os.path.join('..', 'spdx-3-model', 'model')
 TEMPLATE_ROOT_REPO = 'https://api.github.com/repos/spdx/spdx-3-model/contents/model'
+TEMPLATE_ROOT_ARCHIVE = 'https://api.github.com/repos/spdx/spdx-3-model/tarball'
 TEMPLATE_ROOT = TEMPLATE_ROOT_DIR           # Select source of template files
+ARCHIVE_EXTENSIONS = ('.tar.gz', '.tgz', '.tar', '.zip')
+ARCHIVE_MODEL_DIR = 'model'                 # Top of model tree within an archive
 
 OUTPUT_DIR = 'Out'
-OUTPUT_FILE = 'spdxv3-from-list-template'
+OUTPUT_FILE = 'spdxv3-from-list-template'  # Merged model; package models are OUTPUT_FILE-<package>
+OUTPUT_EXTENSIONS = ('.jadn', '.jidl', '.json')
+MODEL_NAMESPACE = 'http://spdx.org/spdx/v3/model'
 MODEL_DIRS = ('Classes', 'Properties', 'Vocabularies')
 CATEGORY_METADATA = '.'
+CACHE_DIR = os.path.join('.cache', 'templates')
+CACHE_MAX_BYTES = 64 * 1024 * 1024          # Least recently used entries are evicted above this size
+CACHE_VERSION = 3                           # Increment when scan_template_file output or entries change
+IR_DIR = os.path.join('.cache', 'ir')       # Intermediate representation of each package
+IR_VERSION = 1                              # Increment when make_package_ir output changes
+MODEL_IR = '_model'
+WATCH_INTERVAL = 0.5                        # Seconds between polls of template files in watch mode
 AUTH = {'Authorization': 'token ' + os.environ['GitHubToken']}      # GitHub public_repo personal access token
 
 
@@ -28,30 +46,139 @@ class WebDirEntry:
     """
     Fake os.DirEntry type for GitHub filesystem
     """
-    def __init__(self, name, path, url):
+    def __init__(self, name, path, url, sha=None):
         self.name = name
         self.path = path
         self.url = url
+        self.sha = sha
 
 
-def list_dir(dirpath: str) -> dict:
+class TemplateCache:
+    """
+    Content-addressed on-disk cache of parsed template files and GitHub directory listings
+
+    Parsed templates are keyed by git blob SHA, taken from the GitHub listing or computed from
+    local file content, so a file is re-parsed only when its content changes.  Directory listings
+    are stored with their ETag and revalidated using conditional requests.
+    """
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = defaultdict(int)
+        os.makedirs(os.path.join(cache_dir, 'parsed'), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, 'listings'), exist_ok=True)
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.cache_dir, kind, key + '.json')
+
+    def _read(self, kind: str, key: str) -> (dict, None):
+        try:
+            with open(fp := self._path(kind, key), encoding='utf8') as fx:
+                entry = json.load(fx)
+            os.utime(fp)                    # Mark as recently used
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, kind: str, key: str, entry: dict) -> None:
+        with open(self._path(kind, key), 'w', encoding='utf8') as fx:
+            json.dump(entry, fx)
+
+    @staticmethod
+    def key(sha: str, category: str, fname: str) -> str:
+        return f'{sha}-{category}-{fname}-{CACHE_VERSION}'.replace(os.sep, '_')
+
+    def get(self, key: str) -> (dict, None):
+        """
+        Return the cached {template, diagnostics} entry for a parsed file, or None on a miss
+        """
+        entry = self._read('parsed', key)
+        self.stats['hits' if entry else 'misses'] += 1
+        return entry
+
+    def put(self, key: str, template: dict, diagnostics: list) -> None:
+        """
+        Save a parsed template and its diagnostics, which are reported again on a hit
+
+        Diagnostics are stored without their file path, because the same content can be found at
+        another path or in another checkout; the path of the file being scanned is filled in on a hit.
+        """
+        self._write('parsed', key, {'template': template, 'diagnostics': [d[1:] for d in diagnostics]})
+
+    def fetch_listing(self, url: str) -> list:
+        """
+        Return the JSON listing of a GitHub directory, revalidating a cached copy with If-None-Match
+        """
+        key = hashlib.sha256(url.encode()).hexdigest()
+        entry = self._read('listings', key)
+        headers = dict(AUTH, **({'If-None-Match': entry['etag']} if entry else {}))
+        try:
+            with urlopen(Request(url, headers=headers)) as d:
+                listing = json.loads(d.read().decode())
+                if etag := d.headers.get('ETag'):
+                    self._write('listings', key, {'etag': etag, 'listing': listing})
+                self.stats['listings_fetched'] += 1
+                return listing
+        except HTTPError as e:
+            if e.code == 304 and entry:
+                self.stats['listings_not_modified'] += 1
+                return entry['listing']
+            raise
+
+    def evict(self) -> None:
+        """
+        Delete least recently used entries until the cache fits within max_bytes
+        """
+        entries = []
+        for kind in ('parsed', 'listings'):
+            with os.scandir(os.path.join(self.cache_dir, kind)) as dlist:
+                entries += [(e.stat().st_mtime, e.stat().st_size, e.path) for e in dlist if e.is_file()]
+        size = sum(e[1] for e in entries)
+        for mtime, fsize, fp in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            os.remove(fp)
+            size -= fsize
+            self.stats['evicted'] += 1
+
+    def summary(self) -> str:
+        st = self.stats
+        return (f'Template cache: {st["hits"]} hits, {st["misses"]} misses, '
+                f'{st["listings_not_modified"]} listings not modified, {st["listings_fetched"]} fetched, '
+                f'{st["evicted"]} evicted')
+
+
+def blob_sha(doc: str) -> str:
+    """
+    Return the git blob SHA of file content, matching the sha attribute of GitHub listings
+    """
+    data = doc.encode('utf8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def list_dir(dirpath: str, cache: TemplateCache = None) -> dict:
     """
     Return a dict listing the files and directories in a directory on local filesystem or GitHub repo.
 
     :param dirpath: str - a filesystem path or GitHub API URL
+    :param cache: optional TemplateCache used to revalidate GitHub listings with conditional requests
     :return: dict {files: [DirEntry*], dirs: [DirEntry*]}
     Local Filesystem: Each list item is an os.DirEntry structure containing name and path attributes
-    GitHub Filesystem: Each list item has name, path, and url (download URL) attributes
+    GitHub Filesystem: Each list item has name, path, url (download URL) and sha (git blob) attributes
     """
 
     files, dirs = [], []
     u = urlparse(dirpath)
     if all([u.scheme, u.netloc]):
-        with urlopen(Request(dirpath, headers=AUTH)) as d:
-            for dl in json.loads(d.read().decode()):
-                url = 'url' if dl['type'] == 'dir' else 'download_url'
-                entry = WebDirEntry(dl['name'], dl[url], dl['url'])
-                (dirs if dl['type'] == 'dir' else files).append(entry)
+        if cache:
+            listing = cache.fetch_listing(dirpath)
+        else:
+            with urlopen(Request(dirpath, headers=AUTH)) as d:
+                listing = json.loads(d.read().decode())
+        for dl in listing:
+            url = 'url' if dl['type'] == 'dir' else 'download_url'
+            entry = WebDirEntry(dl['name'], dl[url], dl['url'], dl.get('sha'))
+            (dirs if dl['type'] == 'dir' else files).append(entry)
     else:
         with os.scandir(dirpath) as dlist:
             for entry in dlist:
@@ -76,6 +203,35 @@ def read_file(path: str) -> str:
     return doc
 
 
+def is_archive(path: str) -> bool:
+    """
+    Return True if path is a local archive file or the GitHub tarball download URL
+    """
+    return path.startswith(TEMPLATE_ROOT_ARCHIVE) or path.endswith(ARCHIVE_EXTENSIONS)
+
+
+def archive_members(path: str):
+    """
+    Generate (member path, content) for each regular file in a .tar.gz/.tgz/.tar/.zip archive.
+
+    Tar archives are read as a stream, so a tarball download is consumed in a single pass without
+    being unpacked to disk.  Zip archives need random access and are buffered in memory when remote.
+    """
+    u = urlparse(path)
+    remote = all([u.scheme, u.netloc])
+    with (urlopen(Request(path, headers=AUTH)) if remote else open(path, 'rb')) as fp:
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(BytesIO(fp.read()) if remote else fp) as zf:
+                for info in zf.infolist():
+                    if not info.is_dir():
+                        yield info.filename, zf.read(info).decode('utf8')
+        else:
+            with tarfile.open(fileobj=fp, mode='r|*') as tf:
+                for info in tf:
+                    if info.isfile():
+                        yield info.name, tf.extractfile(info).read().decode('utf8')
+
+
 def dd():
     """
     Return a recursive defaultdict
@@ -83,99 +239,281 @@ def dd():
     return defaultdict(dd)
 
 
-def scan_template_file(fpath: str, file: str, category: str, fname: str) -> dict:
+class Diagnostic(NamedTuple):
+    """
+    Warning found while scanning template files.  The message is formatted only when it is used.
+    """
+    file: str
+    line: int               # 0 if not associated with a line
+    code: str               # key of DIAGNOSTIC_MESSAGES
+    detail: str = ''
+    context: str = ''
+
+    @property
+    def message(self) -> str:
+        return DIAGNOSTIC_MESSAGES[self.code].format(self.detail)
+
+    def as_dict(self) -> dict:
+        return {'file': self.file, 'line': self.line, 'code': self.code, 'message': self.message}
+
+    def __str__(self) -> str:
+        ln = f' line {self.line}' if self.line else ''
+        cx = f' {self.context}' if self.context else ''
+        return f'    {self.file}{ln}{cx} -- {self.message}'
+
+
+DIAGNOSTIC_MESSAGES = {
+    'heading-mismatch': 'File name does not match heading {}',
+    'unknown-section': 'Unknown section: "{}"',
+    'bad-data': 'bad data: "{}"',
+    'unrecognized-data': 'Unrecognized data: "{}"',
+    'missing-section': 'Missing required section: {}',
+    'root-file': 'file at root level ignored',
+    'ignored-file': '_filename ignored',
+}
+SECTIONS = ('Summary', 'Description', 'Metadata', 'Properties', 'Entries')
+REQUIRED_SECTIONS = {
+    CATEGORY_METADATA: {'Metadata'},
+    'Classes': {'Metadata', 'Properties'},
+    'Properties': {'Metadata'},
+    'Vocabularies': {'Metadata', 'Entries'}
+}
+TEMPLATE_LINE = re.compile(r'(##?|[-*]|\s+[-*])\s+(.+)')     # heading 1 or 2, list item level 1 or 2
+LINE_KIND = {'#': 1, '##': 2, '-': 3, '*': 3}                  # Otherwise 4: list item level 2
+
+
+def scan_template_file(fpath: str, file: str, category: str, fname: str, diagnostics: list = None) -> dict:
     """
     Parse an SPDXv3 template markdown file into a structured object
+
+    Each line is classified once, by its first character and a single compiled pattern.
     :param file: markdown content
     :param category: class type (one of "Classes, "Properties", "Vocabularies)
     :param fname: name of class
+    :param diagnostics: list to which Diagnostic records are appended; printed if None
     :return: dict containing class properties
     """
+    diags = [] if diagnostics is None else diagnostics
     tval = defaultdict(dict)
     tval['Metadata']['name'] = fname
     section = ''
     for ln, line in enumerate(file.splitlines(), start=1):
-        if len(line):
-            if m := re.match(r'^#\s+(.+)\s*$', line):
-                if fname != m.group(1):
-                    print(f'    {fpath} line {ln} -- File name does not match heading {m.group(1)}')
-            elif m := re.match(r'^##\s+(.+)\s*$', line):
-                section = m.group(1)
+        if not line:
+            continue
+        c = line[0]
+        if (c in '#-*' or c.isspace()) and (m := TEMPLATE_LINE.match(line)):
+            kind, text = LINE_KIND.get(m.group(1), 4), m.group(2)
+            if kind == 1:
+                if fname != text:
+                    diags.append(Diagnostic(fpath, ln, 'heading-mismatch', text))
+            elif kind == 2:
+                section = text
                 li1, li2 = '', ''
-                if section not in ('Summary', 'Description', 'Metadata', 'Properties', 'Entries'):
-                    print(f'    {fpath} line {ln} -- Unknown section: "{section}"')
-                # if section == 'Metadata':
-                #    tval[section] = {'name': fname}
-                    # default property values from top-level "Defaults.md"
-                #    cdefault = {'id': '${NAMESPACE_id}/' + fname, 'Instantiability': 'Concrete', 'Status': 'Stable'}
-                #    tval[section].update(cdefault if category == 'Classes' else {})
-            elif m := re.match(r'^[-*]\s+(.+)\s*$', line):
-                li1 = m.group(1)
+                if section not in SECTIONS:
+                    diags.append(Diagnostic(fpath, ln, 'unknown-section', section))
+            elif kind == 3:
+                li1 = text
                 if section in ('Metadata', 'Entries'):
                     k, v = li1.split(':', maxsplit=1)
                     tval[section].update({k.strip(): v.strip()})
                 elif section == 'Properties':
                     pdefault = {'minCount': 0, 'maxCount': '*'} if category == 'Classes' else {}
                     tval[section].update({li1: pdefault})
-            elif m := re.match(r'^\s+[-*]\s+(.+)\s*$', line):
-                li2 = m.group(1)
+            else:
+                li2 = text
                 if section == 'Properties':
                     if ':' in li2:
                         k, v = li2.split(':', maxsplit=1)
                         tval[section][li1].update({k.strip(): v.strip()})
                     else:
-                        print(f'    {fpath} line {ln} {section}/{li1} -- bad data: "{li2}"')
-            elif line.startswith('SPDX-License-Identifier:'):
-                pass
-            elif section not in ('Description', 'Summary'):
-                print(f'    {fpath} line {ln} -- Unrecognized data: "{line}"')
-    missing = { CATEGORY_METADATA: set(('Metadata',)),
-                'Classes': set(('Metadata', 'Properties')),
-                'Properties': set(('Metadata',)),
-                'Vocabularies': set(('Metadata', 'Entries'))}[category] - set(tval)
-    if missing:
-        print(f'    {fpath} -- Missing required section: {missing}')
+                        diags.append(Diagnostic(fpath, ln, 'bad-data', li2, f'{section}/{li1}'))
+        elif line.startswith('SPDX-License-Identifier:'):
+            pass
+        elif section not in ('Description', 'Summary'):
+            diags.append(Diagnostic(fpath, ln, 'unrecognized-data', line))
+    if missing := REQUIRED_SECTIONS[category] - tval.keys():
+        diags.append(Diagnostic(fpath, 0, 'missing-section', ', '.join(sorted(missing))))
+    if diagnostics is None:
+        for d in diags:
+            print(d)
     return dict(tval)
 
 
-def load_template_from_list_dirs(rootdir: str) -> dict:
+def scan_template(fpath: str, file: str, category: str, fname: str) -> (dict, list):
+    """
+    Parse a template file, returning the parsed template and its diagnostics
+    """
+    template = scan_template_file(fpath, file, category, fname, diagnostics := [])
+    return template, diagnostics
+
+
+class ScanQueue:
+    """
+    Ordered queue of progress messages, diagnostics and template parse jobs
+
+    Jobs are parsed immediately when jobs == 1, otherwise they are submitted to a process pool.
+    Results are stored and messages printed in queue order, so output is identical to a serial run.
+    Cache hits are resolved without parsing; cache misses are saved when their results are stored.
+    Diagnostics are collected in queue order and printed only if verbose.
+    """
+    def __init__(self, cache: TemplateCache = None, jobs: int = 1, verbose: bool = True):
+        self.cache = cache
+        self.pool = ProcessPoolExecutor(jobs) if jobs > 1 else None
+        self.verbose = verbose
+        self.diagnostics = []
+        self.items = deque()
+
+    def print(self, text: str) -> None:
+        self.items.append(text)
+        self.drain(wait=False)
+
+    def diagnostic(self, diag: Diagnostic) -> None:
+        self.items.append(diag)
+        self.drain(wait=False)
+
+    def scan(self, target: dict, fpath: str, category: str, fname: str, doc: str = None,
+             read: callable = None, sha: str = None) -> None:
+        """
+        Queue a template file to be parsed into target[fname]
+
+        :param doc: file content, or None if not yet read
+        :param read: function returning file content, called only if it is needed
+        :param sha: git blob SHA of the content, if known without reading it
+        """
+        key = None
+        if self.cache:
+            if sha is None:
+                sha = blob_sha(doc := read() if doc is None else doc)
+            if entry := self.cache.get(key := self.cache.key(sha, category, fname)):
+                diags = [Diagnostic(fpath, *d) for d in entry['diagnostics']]
+                self.items.append((target, fname, None, (entry['template'], diags)))
+                return self.drain(wait=False)
+        doc = read() if doc is None else doc
+        if self.pool:
+            result = self.pool.submit(scan_template, fpath, doc, category, fname)
+        else:
+            result = scan_template(fpath, doc, category, fname)
+        self.items.append((target, fname, key, result))
+        self.drain(wait=False)
+
+    def drain(self, wait: bool = True) -> None:
+        """
+        Print messages and store results in queue order, up to the first unfinished job unless wait
+        """
+        while self.items:
+            item = self.items[0]
+            if isinstance(item, str):
+                if self.verbose:
+                    print(item)
+            elif isinstance(item, Diagnostic):
+                self._report([item])
+            else:
+                target, fname, key, result = item
+                if isinstance(result, Future):
+                    if not (wait or result.done()):
+                        return
+                    result = result.result()
+                target[fname], diags = result
+                self._report(diags)
+                if key:
+                    self.cache.put(key, *result)
+            self.items.popleft()
+
+    def _report(self, diags: list) -> None:
+        self.diagnostics += diags
+        if self.verbose:
+            for d in diags:
+                print(d)
+
+    def close(self) -> None:
+        self.drain()
+        if self.pool:
+            self.pool.shutdown()
+
+
+def load_template_from_list_dirs(rootdir: str, queue: ScanQueue = None) -> dict:
     """
     Load SPDX v3 template from individual files in markdown list format
     :param rootdir: top level in directory hierarchy
+    :param queue: ScanQueue holding the optional cache, worker pool and collected diagnostics
     """
 
     def _d(path: str) -> str:
-        print(f'  dir: {path}')
+        queue.print(f'  dir: {path}')
         return path.removeprefix(rootdir)
 
     def _f(path: str) -> str:
-        print(f'  file: {path}')
+        queue.print(f'  file: {path}')
         model = urlparse(path).path.removeprefix(urlparse(rootdir).path)
         return path.removeprefix(path.removesuffix(model))
 
+    def _scan(target: dict, entry: os.DirEntry, category: str) -> None:
+        fname = os.path.splitext(entry.name)[0]
+        queue.scan(target, _f(entry.path), category, fname,
+                   read=lambda: read_file(entry.path), sha=getattr(entry, 'sha', None))
+
+    templ = dd()
+    queue = queue or ScanQueue()
+    cache = queue.cache
+    try:
+        t1 = list_dir(rootdir, cache)
+        for f1 in t1['files']:
+            queue.diagnostic(Diagnostic(_f(f1.path), 0, 'root-file'))
+        for d1 in t1['dirs']:
+            t2 = list_dir(d1.path, cache)
+            for f2 in t2['files']:
+                _scan(templ[d1.name][CATEGORY_METADATA], f2, CATEGORY_METADATA)
+            for d2 in t2['dirs']:
+                if d2.name not in MODEL_DIRS:
+                    raise ValueError(f'{_d(d2.path)} -- unexpected directory, not in {MODEL_DIRS}')
+                t3 = list_dir(d2.path, cache)
+                for d3 in t3['dirs']:
+                    raise ValueError(f'{_d(d3.path)} -- unexpected directory at leaf level')
+                for f3 in t3['files']:
+                    if f3.name.startswith('_'):
+                        queue.diagnostic(Diagnostic(_f(f3.path), 0, 'ignored-file'))
+                    else:
+                        _scan(templ[d1.name][d2.name], f3, d2.name)
+    finally:
+        queue.drain()
+    return dict(templ)
+
+
+def load_template_from_archive(archive: str, queue: ScanQueue = None) -> dict:
+    """
+    Load SPDX v3 template from markdown files in a single archive of the model repository
+    :param archive: local .tar.gz/.zip file or tarball download URL
+    :param queue: ScanQueue holding the optional cache, worker pool and collected diagnostics
+    """
+
+    def _f(path: str) -> str:
+        queue.print(f'  file: {path}')
+        return path
+
     templ = dd()
-    t1 = list_dir(rootdir)
-    for f1 in t1['files']:
-        print(f'    {_f(f1.path)} -- file at root level ignored')
-    for d1 in t1['dirs']:
-        t2 = list_dir(d1.path)
-        for f2 in t2['files']:
-            doc = read_file(f2.path)
-            fname = os.path.splitext(f2.name)[0]
-            templ[d1.name][CATEGORY_METADATA][fname] = scan_template_file(_f(f2.path), doc, CATEGORY_METADATA, fname)
-        for d2 in t2['dirs']:
-            if d2.name not in MODEL_DIRS:
-                raise ValueError(f'{_d(d2.path)} -- unexpected directory, not in {MODEL_DIRS}')
-            t3 = list_dir(d2.path)
-            for d3 in t3['dirs']:
-                raise ValueError(f'{_d(d3.path)} -- unexpected directory at leaf level')
-            for f3 in t3['files']:
-                if f3.name.startswith('_'):
-                    print(f'    {_f(f3.path)} -- _filename ignored')
-                else:
-                    doc = read_file(f3.path)
-                    fname = os.path.splitext(f3.name)[0]
-                    templ[d1.name][d2.name][fname] = scan_template_file(_f(f3.path), doc, d2.name, fname)
+    queue = queue or ScanQueue()
+    try:
+        for name, doc in archive_members(archive):
+            parts = [p for p in name.split('/') if p not in ('', '.')]
+            if ARCHIVE_MODEL_DIR not in parts[:2]:
+                continue                    # Skip files outside the model tree (README, LICENSE, ...)
+            parts = parts[parts.index(ARCHIVE_MODEL_DIR) + 1:]
+            path = '/' + '/'.join(parts)
+            fname = os.path.splitext(parts[-1])[0]
+            if len(parts) == 1:
+                queue.diagnostic(Diagnostic(_f(path), 0, 'root-file'))
+            elif len(parts) == 2:
+                queue.scan(templ[parts[0]][CATEGORY_METADATA], _f(path), CATEGORY_METADATA, fname, doc=doc)
+            elif parts[1] not in MODEL_DIRS:
+                raise ValueError(f'{os.path.dirname(path)} -- unexpected directory, not in {MODEL_DIRS}')
+            elif len(parts) > 3:
+                raise ValueError(f'{os.path.dirname(path)} -- unexpected directory at leaf level')
+            elif parts[2].startswith('_'):
+                queue.diagnostic(Diagnostic(_f(path), 0, 'ignored-file'))
+            else:
+                queue.scan(templ[parts[0]][parts[1]], _f(path), parts[1], fname, doc=doc)
+    finally:
+        queue.drain()
     return dict(templ)
 
 
@@ -210,67 +548,257 @@ def fieldtype(typename: str) -> str:
     return tmap[typename] if typename in tmap else typename
 
 
-if __name__ == '__main__':
-    print(f'JADN Version: {jadn.__version__}, Test Data: {TEMPLATE_ROOT}, Access Token: ..{AUTH["Authorization"][-4:]}')
+def package_fingerprint(template: dict) -> str:
+    """
+    Return a hash of a package's parsed templates plus everything else its generated model depends on
+    """
+    data = json.dumps([IR_VERSION, jadn.__version__, template], sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
 
-    # Load data from directory tree of individual files
-    print(f'Scanning template files from "{TEMPLATE_ROOT}"')
-    templates = load_template_from_list_dirs(TEMPLATE_ROOT)
 
-    print(f'\nConverting logical model to information model: {OUTPUT_DIR}/{OUTPUT_FILE}')
-    for package, template in templates.items():
-        # if package != 'Core':
-            # continue            # Ignore other packages until template has real data
+def make_package_ir(package: str, template: dict, fingerprint: str) -> dict:
+    """
+    Convert a package's templates to its intermediate representation: namespace and JADN type definitions
+    """
+    namespace = template.get(CATEGORY_METADATA, {}).get(package, {}).get('Metadata', {}).get('id')
+    namespace = namespace or 'http://foo.com/' + package
+    types = []
+
+    # Convert Class Properties (shape) sections to Record type definitions
+    props = []
+    for mt in template.get('Classes', {}).values():
+        fields = []
+        sect = mt.get('Properties', {})
+        if not sect:
+            print(f'  Missing properties section - {mt["Metadata"]["name"]}')
+        for fn, fv in enumerate(sect.items(), start=1):
+            ftype = fv[1].get('type', '')
+            if not ftype:
+                print(f'  Missing type - {mt["Metadata"]["name"]}:{fv[0]}')
+            opts = multopts(fv[1]['minCount'], fv[1]['maxCount'])
+            fields.append([fn, fv[0], fieldtype(ftype), opts, ''])
+            props.append([fv[0], ftype, ''])
+        types.append([mt['Metadata']['name'], 'Record', [], '', fields])
+
+    # Validate redundant "Properties" files for consistency with Class properties
+    for p in props:
+        if (prop := template.get('Properties', {}).get(p[0])) is None:
+            print(f'  No Property {p[0]}')
+        elif (meta := prop.get('Metadata', {})).get('Range') != p[1]:
+            print(f'  {str(p):40} != {meta}')
+
+    # Convert "Vocabularies" sections to Enumerated type definitions
+    for mt in template.get('Vocabularies', {}).values():
+        items = []
+        sect = mt.get('Entries', {})
+        if not sect:
+            print(f'  Missing entries section - {mt["Metadata"]["name"]}')
+        for fn, fv in enumerate(sect.items(), start=1):
+            items.append([fn, fv[0], fv[1]])
+        types.append([mt['Metadata']['name'], 'Enumerated', [], '', items])
+    return {'package': package, 'fingerprint': fingerprint, 'namespace': namespace, 'types': types}
+
+
+def load_ir(name: str) -> (dict, None):
+    try:
+        with open(os.path.join(IR_DIR, name + '.json'), encoding='utf8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def save_ir(name: str, ir: dict) -> None:
+    os.makedirs(IR_DIR, exist_ok=True)
+    with open(os.path.join(IR_DIR, name + '.json'), 'w', encoding='utf8') as fp:
+        json.dump(ir, fp)
+
+
+def output_paths(name: str) -> list:
+    return [os.path.join(OUTPUT_DIR, name + ext) for ext in OUTPUT_EXTENSIONS]
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """
+    Write a file only if its content differs from the existing file, leaving unchanged outputs untouched
+    """
+    try:
+        with open(path, encoding='utf8') as fp:
+            if fp.read() == content:
+                return False
+    except OSError:
+        pass
+    with open(path, 'w', encoding='utf8') as fp:
+        fp.write(content)
+    return True
+
+
+def generate_model(schema: dict, name: str) -> None:
+    """
+    Write information model (.jadn, .jidl) and JSON Schema (.json) files and check the model for completeness
+    """
+    # TODO: generate XML schema (.xsd), YAML, spreadsheet, Tag:Value, etc.
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    outputs = {
+        '.jadn': jadn.dumps(schema) + '\n',
+        '.jidl': jadn.convert.jidl_dumps(schema),
+        '.json': jadn.translate.json_schema_dumps(schema)
+    }
+    for ext, content in outputs.items():
+        if write_if_changed(os.path.join(OUTPUT_DIR, name + ext), content):
+            print(f'  wrote {name + ext}')
+    try:
+        print('\n', '\n'.join([f'{k:>15}: {v}' for k, v in jadn.analyze(jadn.check(schema)).items()]))
+    except ValueError as e:
+        print(f'\n{e}')
 
-        try:
-            namespace = template[CATEGORY_METADATA][package]['Metadata']['id']
-        except KeyError:
-            namespace = 'http://foo.com/' + package
-        schema = {'info': {'package': namespace}, 'types': []}
-
-        # Convert Class Properties (shape) sections to Record type definitions
-        props = []
-        for mt in template['Classes'].values():
-            fields = []
-            sect = mt.get('Properties', {})
-            if not sect:
-                print(f'  Missing properties section - {mt["Metadata"]["name"]}')
-            for fn, fv in enumerate(sect.items(), start=1):
-                ftype = fv[1].get('type', '')
-                if not ftype:
-                    print(f'  Missing type - {mt["Metadata"]["name"]}:{fv[0]}')
-                opts = multopts(fv[1]['minCount'], fv[1]['maxCount'])
-                fields.append([fn, fv[0], fieldtype(ftype), opts, ''])
-                props.append([fv[0], ftype, ''])
-            schema['types'].append([mt['Metadata']['name'], 'Record', [], '', fields])
-
-        # Validate redundant "Properties" files for consistency with Class properties
-        for p in props:
+
+def update_models(templates: dict, force: bool = False, packages: set = None) -> list:
+    """
+    Regenerate the model of each package whose templates changed since the last run, then the merged model
+
+    The intermediate representation of each package is persisted in IR_DIR with a fingerprint of its
+    templates.  Unchanged packages are loaded from their IR and are not converted, written or checked.
+    :param packages: if given, only these packages may have changed; others are taken from their IR
+    :return: names of regenerated packages
+    """
+    irs, changed = {}, []
+    for package, template in templates.items():
+        ir = load_ir(package)
+        if ir and packages is not None and package not in packages:
+            irs[package] = ir
+            continue
+        fingerprint = package_fingerprint(template)
+        name = f'{OUTPUT_FILE}-{package}'
+        if force or not ir or ir['fingerprint'] != fingerprint or not all(map(os.path.exists, output_paths(name))):
+            print(f'\n{package}:')
+            ir = make_package_ir(package, template, fingerprint)
+            generate_model({'info': {'package': ir['namespace']}, 'types': ir['types']}, name)
+            save_ir(package, ir)
+            changed.append(package)
+        irs[package] = ir
+
+    fingerprint = hashlib.sha256(' '.join(f'{p}:{ir["fingerprint"]}' for p, ir in irs.items()).encode()).hexdigest()
+    model_ir = load_ir(MODEL_IR)
+    if changed or not model_ir or model_ir['fingerprint'] != fingerprint or \
+            not all(map(os.path.exists, output_paths(OUTPUT_FILE))):
+        print(f'\nMerged model ({len(irs)} packages):')
+        schema = {'info': {'package': MODEL_NAMESPACE}, 'types': [t for ir in irs.values() for t in ir['types']]}
+        generate_model(schema, OUTPUT_FILE)
+        save_ir(MODEL_IR, {'fingerprint': fingerprint, 'packages': list(irs)})
+    return changed
+
+
+def snapshot_tree(rootdir: str) -> dict:
+    """
+    Return {path: (mtime, size, inode)} for every file under a local template directory
+    """
+    state = {}
+    for dirpath, dirnames, filenames in os.walk(rootdir):
+        for fn in filenames:
             try:
-                if template['Properties'][p[0]]['meta']['Range'] != p[1]:
-                    print(f'  {str(p):40} != {template["Properties"][p[0]]["meta"]}')
-            except KeyError:
-                print(f'  No Property {p[0]}')
-
-        # Convert "Vocabularies" sections to Enumerated type definitions
-        for mt in template['Vocabularies'].values():
-            items = []
-            sect = mt.get('Entries', {})
-            if not sect:
-                print(f'  Missing entries section - {mt["Metadata"]["name"]}')
-            for fn, fv in enumerate(sect.items(), start=1):
-                items.append([fn, fv[0], fv[1]])
-            schema['types'].append([mt['Metadata']['name'], 'Enumerated', [], '', items])
-
-        # Generate information model (.jadn, .jidl) and JSON Schema (.json)
-        # TODO: generate XML schema (.xsd), YAML, spreadsheet, Tag:Value, etc.
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        jadn.dump(schema, os.path.join(OUTPUT_DIR, OUTPUT_FILE + '.jadn'))
-        jadn.convert.jidl_dump(schema, os.path.join(OUTPUT_DIR, OUTPUT_FILE + '.jidl'))
-        jadn.translate.json_schema_dump(schema, os.path.join(OUTPUT_DIR, OUTPUT_FILE + '.json'))
-
-        # Check for completeness
+                st = os.stat(path := os.path.join(dirpath, fn))
+                state[path] = (st.st_mtime_ns, st.st_size, st.st_ino)
+            except OSError:
+                pass                        # Deleted while scanning, picked up on next poll
+    return state
+
+
+def rescan_files(rootdir: str, templates: dict, paths: list, state: dict, queue: ScanQueue) -> (set, None):
+    """
+    Update templates for added, modified and deleted template files
+
+    :param state: snapshot_tree of rootdir after the change; paths not in state have been deleted
+    :return: names of affected packages, or None if the directory layout changed and the tree must be reloaded
+    """
+    packages = set()
+    for path in paths:
+        parts = os.path.relpath(path, rootdir).split(os.sep)
+        if len(parts) == 2:
+            category = CATEGORY_METADATA
+        elif len(parts) == 3 and parts[1] in MODEL_DIRS:
+            category = parts[1]
+            if parts[2].startswith('_'):
+                continue
+        else:
+            return None
+        package, fname = parts[0], os.path.splitext(parts[-1])[0]
+        packages.add(package)
+        if path in state:
+            queue.print(f'  file: {path}')
+            target = templates.setdefault(package, dd())[category]
+            queue.scan(target, '/' + '/'.join(parts), category, fname, read=lambda p=path: read_file(p))
+        elif not os.path.isdir(os.path.join(rootdir, package)):
+            templates.pop(package, None)
+        else:
+            templates.get(package, {}).get(category, {}).pop(fname, None)
+    queue.drain()
+    return packages
+
+
+def watch_templates(rootdir: str, templates: dict, state: dict, queue: ScanQueue, interval: float) -> None:
+    """
+    Poll a local template directory and rebuild the models of packages whose template files change
+
+    Parsed templates are kept in memory; only added or modified files are scanned, and only the affected
+    packages and the merged model are regenerated.  Stop with Ctrl-C.
+    :param state: snapshot_tree of rootdir taken before templates were loaded
+    """
+    print(f'\nWatching "{rootdir}" for changes (Ctrl-C to stop)')
+    while True:
+        time.sleep(interval)
+        new_state = snapshot_tree(rootdir)
+        paths = sorted(p for p in state.keys() | new_state.keys() if state.get(p) != new_state.get(p))
+        state = new_state
+        if not paths:
+            continue
+        start = time.perf_counter()
+        print(f'\n{len(paths)} template files changed')
+        if (packages := rescan_files(rootdir, templates, paths, state, queue)) is None:
+            print('Directory layout changed, rescanning all templates')
+            templates.clear()
+            templates.update(load_template_from_list_dirs(rootdir, queue))
+        changed = update_models(templates, packages=packages)
+        print(f'{len(changed)} packages regenerated in {time.perf_counter() - start:.3f} sec', *changed)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Generate JADN information model from SPDXv3 template files')
+    parser.add_argument('-s', '--source', default=TEMPLATE_ROOT, help='template directory, GitHub URL or archive')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes used to parse templates')
+    parser.add_argument('-d', '--diagnostics', help='write template diagnostics to this file as JSON lines')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print scanned files and diagnostics')
+    parser.add_argument('-f', '--force', action='store_true', help='regenerate all packages even if unchanged')
+    parser.add_argument('-w', '--watch', action='store_true', help='rebuild when local template files change')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help='seconds between watch polls')
+    args = parser.parse_args()
+    if args.watch and (is_archive(args.source) or not os.path.isdir(args.source)):
+        parser.error('--watch requires a local template directory')
+    print(f'JADN Version: {jadn.__version__}, Test Data: {args.source}, Access Token: ..{AUTH["Authorization"][-4:]}')
+
+    # Load data from directory tree of individual files or from a single archive of the model tree
+    print(f'Scanning template files from "{args.source}"')
+    cache = TemplateCache()
+    queue = ScanQueue(cache, args.jobs, verbose=not args.quiet)
+    state = snapshot_tree(args.source) if args.watch else {}
+    if is_archive(args.source):
+        templates = load_template_from_archive(args.source, queue)
+    else:
+        templates = load_template_from_list_dirs(args.source, queue)
+    print(f'{len(queue.diagnostics)} template diagnostics')
+    if args.diagnostics:
+        with open(args.diagnostics, 'w', encoding='utf8') as fp:
+            for d in queue.diagnostics:
+                fp.write(json.dumps(d.as_dict()) + '\n')
+
+    print(f'\nConverting logical model to information model: {OUTPUT_DIR}/{OUTPUT_FILE}')
+    changed = update_models(templates, force=args.force)
+    print(f'\n{len(changed)} of {len(templates)} packages regenerated', *changed)
+
+    if args.watch:
         try:
-            print('\n', '\n'.join([f'{k:>15}: {v}' for k, v in jadn.analyze(jadn.check(schema)).items()]))
-        except ValueError as e:
-            print(f'\n{e}')
+            watch_templates(args.source, templates, state, queue, args.interval)
+        except KeyboardInterrupt:
+            print('\nStopped watching')
+    queue.close()
+    cache.evict()
+    print(f'\n{cache.summary()}')
@@ -0,0 +1,41 @@
+"""
+Run the tests from the repository root, where the scripts find their Schemas and Data directories
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+sys.path.insert(0, ROOT)
+os.environ.setdefault('GitHubToken', '')        # Not used by the tests, but required by template2model
+
+
+def load_script(name: str):
+    """
+    Import a script whose file name is not a module name, e.g. check-elements.py
+    """
+    return importlib.import_module(name)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture(scope='session')
+def spdx3():
+    """
+    check-elements, with the schema, verbose Codec and IriPlan of its SPDX v3 schema
+    """
+    import jadn
+    from schema_cache import SchemaCache
+    os.chdir(ROOT)
+    ce = load_script('check-elements')
+    cache = SchemaCache()
+    schema = cache.load(ce.SCHEMA, ce.load_any)['schema']
+    codec = jadn.codec.Codec(schema, verbose_rec=True, verbose_str=True)
+    plan = ce.IriPlan.from_tree(cache.derived(ce.SCHEMA, 'IriPlan', lambda s: ce.IriPlan(s).root))
+    return ce, schema, codec, plan
@@ -0,0 +1,46 @@
+import asyncio
+import io
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def batch_results(ce, pool, files: list) -> tuple:
+    fp = io.StringIO()
+    totals = asyncio.run(ce.check_batch(pool, 2, files, fp))
+    return {os.path.basename(r['file']): r for r in map(json.loads, fp.getvalue().splitlines())}, totals
+
+
+def write_documents(ce, tmp_path) -> list:
+    shutil.copy(os.path.join(ce.DATA_DIR, 'package-rev1.json'), tmp_path / 'valid.json')
+    (tmp_path / 'invalid.json').write_text('{"elements": [{"id": 1}]}')
+    (tmp_path / 'unreadable.json').write_bytes(b'{"name": "\xff"}')
+    return ce.document_paths([str(tmp_path)])
+
+
+def test_batch_writes_a_result_line_per_document(spdx3, tmp_path):
+    ce, schema, codec, plan = spdx3
+    files = write_documents(ce, tmp_path)
+    with ProcessPoolExecutor(2, initializer=ce.init_worker, initargs=(schema, plan)) as pool:
+        results, totals = batch_results(ce, pool, files)
+
+    assert {f: r['status'] for f, r in results.items()} == {
+        'valid.json': 'valid', 'invalid.json': 'invalid', 'unreadable.json': 'unreadable'}
+    assert results['valid.json']['elements'] == 6 and results['valid.json']['timings']['read'] >= 0
+    assert 'error' in results['invalid.json'] and 'error' in results['unreadable.json']
+    assert (totals['documents'], totals['valid'], totals['invalid'], totals['unreadable']) == (3, 1, 1, 1)
+    assert '3 documents (1 valid, 1 invalid, 1 unreadable, 0 errors)' in ce.batch_summary(totals)
+
+
+def test_batch_reports_worker_exceptions(spdx3, tmp_path, monkeypatch):
+    ce, schema, codec, plan = spdx3
+    files = write_documents(ce, tmp_path)
+    monkeypatch.setattr(ce, '_worker', {})          # check_text raises KeyError in an uninitialized worker
+    with ThreadPoolExecutor(2) as pool:
+        results, totals = batch_results(ce, pool, files)
+
+    assert {f: r['status'] for f, r in results.items()} == {
+        'valid.json': 'error', 'invalid.json': 'error', 'unreadable.json': 'unreadable'}
+    assert results['valid.json']['error'] == "KeyError: 'codec'"
+    assert (totals['documents'], totals['error']) == (3, 2)
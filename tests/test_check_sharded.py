@@ -0,0 +1,20 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def test_sharded_undefined_counts_match_sequential(spdx3, tmp_path):
+    ce, schema, codec, plan = spdx3
+    ce.init_worker(schema, plan)
+    doc = json.loads(ce.read_text(os.path.join(ce.DATA_DIR, 'package-rev1.json')))
+    doc['created']['by'] = ['nobody']       # One undefined reference, in the defaults of every element
+    documents = [doc] + [json.loads(ce.read_text(p)) for p in ce.document_paths([ce.DATA_DIR])]
+
+    with ProcessPoolExecutor(3, initializer=ce.init_worker, initargs=(schema, plan)) as pool:
+        for document in documents:
+            result = ce.check_text(json.dumps(document))[0]
+            for shards in (1, 2, 3):
+                ctx, x_elements, errors = ce.check_sharded(pool, shards, codec, schema, plan, document)
+                assert dict(ctx['index'].undefined) == result['undefined']
+                assert len(x_elements) == result['elements']
+    assert ce.check_text(json.dumps(doc))[0]['undefined'] == {'nobody': 1}
@@ -0,0 +1,17 @@
+import os
+
+from canonical import canonical_element
+
+
+def test_compress_does_not_change_expanded_elements(spdx3):
+    ce, schema, codec, plan = spdx3
+    doc = codec.decode(ce.DOCUMENT_TYPE, ce.json.loads(ce.read_text(os.path.join(ce.DATA_DIR, 'package-rev1.json'))))
+    view = ce.DocumentView(ce.validate_document(doc, plan), doc['elements'])
+    expanded = list(view)
+    before = [canonical_element(e) for e in expanded]
+    compressed = [ce.compress_element(view.context, e) for e in expanded]
+
+    assert [canonical_element(e) for e in view] == before
+    relationship = next(e['type']['relationship'] for e in compressed if 'relationship' in e['type'])
+    assert all(':' not in iri for iri in relationship['to'])
+    assert [ce.compress_element(view.context, e) for e in view] == compressed
@@ -0,0 +1,41 @@
+import json
+import os
+
+ACME = 'http://sbom.acme.com/AX7CqA-I/'
+REV2 = 'sha256:0kEfWkpXWZWQCk87lYeAoC1jCrt4g2nFr7ctzYAQqf8/'
+
+
+def diff(spdx3, tmp_path, old: str, new: str) -> tuple:
+    ce, schema, codec, plan = spdx3
+    patch = tmp_path / 'diff.patch.jsonl'
+    report = ce.diff_documents(codec, schema, plan, os.path.join(ce.DATA_DIR, old), os.path.join(ce.DATA_DIR, new),
+                               str(patch))
+    header, *changes = map(json.loads, patch.read_text().splitlines())
+    assert header == {'old': ACME, 'new': REV2}
+    return report, changes
+
+
+def test_diff_copied_revision(spdx3, tmp_path):
+    report, changes = diff(spdx3, tmp_path, 'package-rev1.json', 'package-rev2-copy.json')
+    assert dict(report.counts) == {'unchanged': 3, 'added': 2, 'modified': 1, 'removed': 2,
+                                   'edges added': 2, 'edges removed': 2}
+    assert [(c['op'], c['element']['id'] if 'element' in c else c['id']) for c in changes] == [
+        ('add', REV2 + 'foo-contents-rev2'),
+        ('add', REV2 + 'foo-contents-amend-rev2'),
+        ('modify', ACME + 'annotation-rev1'),
+        ('remove', ACME + 'foo-contents-rev1'),
+        ('remove', ACME + 'world-file'),
+    ]
+    assert changes[2]['element']['type']['annotation']['subject'] == ACME + 'foo-metadatarev1'
+    assert set(report.examples['edges removed']) == {
+        (ACME + 'foo-metadata-rev1', ACME + 'world-file', 'CONTAINS'),
+        (ACME + 'annotation-rev1', ACME + 'foo-metadata-rev1', 'annotation'),
+    }
+    assert (REV2 + 'foo-contents-rev2', 'acme:foo-contents-rev1', 'AMENDS') in report.examples['edges added']
+
+
+def test_diff_referenced_revision(spdx3, tmp_path):
+    report, changes = diff(spdx3, tmp_path, 'package-rev1.json', 'package-rev2-reference.json')
+    assert dict(report.counts) == {'added': 2, 'referenced': 6, 'edges added': 1}
+    assert [c['op'] for c in changes] == ['add', 'add']       # Referenced elements and their edges are not removed
+    assert report.examples['edges added'] == [(REV2 + 'foo-contents-rev2', ACME + 'foo-contents-rev1', 'AMENDS')]
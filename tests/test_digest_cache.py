@@ -0,0 +1,29 @@
+import hashlib
+
+from conftest import load_script
+
+
+def sha256(b: bytes) -> str:
+    return hashlib.sha256(b).hexdigest()
+
+
+def test_changed_element_with_same_iri_is_rehashed():
+    ce = load_script('check-elements')
+    cache = ce.DigestCache()
+    old, new = b'{"id":"x","name":"old"}', b'{"id":"x","name":"new"}'
+    assert cache.hash(['x', 'y'], [old, b'{"id":"y"}']) == [sha256(old), sha256(b'{"id":"y"}')]
+    assert cache.hash(['x'], [bytes(bytearray(old))]) == [sha256(old)]     # Equal bytes, another object
+    assert cache.hash(['x'], [new]) == [sha256(new)]
+    assert cache.hash(['x'], [old]) == [sha256(old)]
+    assert (cache.stats['elements'], cache.stats['hashed']) == (5, 4)
+
+
+def test_cache_is_bounded_by_bytes():
+    ce = load_script('check-elements')
+    cache = ce.DigestCache(max_bytes=3 * (ce.DigestCache.ENTRY_BYTES + 100))
+    blobs = [bytes([n]) * 100 for n in range(10)]
+    assert cache.hash([str(n) for n in range(10)], blobs) == [sha256(b) for b in blobs]
+    assert list(cache.digests) == ['7', '8', '9']                       # Oldest entries dropped
+    assert cache.size == 3 * (ce.DigestCache.ENTRY_BYTES + 100)
+    cache.hash(['9'], [b'changed'])
+    assert cache.size == 2 * (ce.DigestCache.ENTRY_BYTES + 100) + ce.DigestCache.ENTRY_BYTES + 7
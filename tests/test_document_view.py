@@ -0,0 +1,16 @@
+import os
+
+ACME = 'http://sbom.acme.com/AX7CqA-I/'
+
+
+def test_lookup_by_iri_compact_and_local_id(spdx3):
+    ce, schema, codec, plan = spdx3
+    doc = codec.decode(ce.DOCUMENT_TYPE, ce.json.loads(ce.read_text(os.path.join(ce.DATA_DIR, 'package-rev2-copy.json'))))
+    view = ce.DocumentView(ce.validate_document(doc, plan), doc['elements'])
+    namespace = view.context['namespace']
+
+    assert view[ACME + 'hello-file'] is view['acme-1493:hello-file']
+    assert view[ACME + 'hello-file']['id'] == ACME + 'hello-file'
+    assert view[namespace + 'foo-contents-rev2'] is view['foo-contents-rev2']
+    assert ACME + 'missing' not in view and view.get('acme-1493:missing') is None
+    assert len(view.expanded) == 2
@@ -0,0 +1,44 @@
+import json
+import os
+
+from canonical import canonical_element
+from element_store import ElementStore
+
+NAMESPACE = 'http://example.com/doc/'
+
+
+def element(local: str, name: str) -> dict:
+    return {'id': NAMESPACE + local, 'type': {'file': {}}, 'name': name}
+
+
+def test_replace_drops_unreferenced_elements(tmp_path):
+    store = ElementStore(str(tmp_path / 'elements.db'))
+    store.ingest(NAMESPACE, 'rev1.json', [element('a', 'one'), element('b', 'two')])
+    store.ingest('http://example.com/copy/', 'copy.json', [element('b', 'two')])
+    assert store.ingest(NAMESPACE, 'rev2.json', [element('a', 'changed'), element('b', 'two')]) == (1, 1, 0)
+
+    count = {t: store.db.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0] for t in ('elements', 'bodies')}
+    assert count == {'elements': 2, 'bodies': 2}
+    assert store.lookup([NAMESPACE + 'a'])[NAMESPACE + 'a'] == [element('a', 'changed')]
+    store.close()
+
+
+def test_resolve_data3_references(spdx3, tmp_path):
+    ce, schema, codec, plan = spdx3
+    ce.init_worker(schema, plan)
+    store = ElementStore(str(tmp_path / 'elements.db'))
+    documents = {}
+    for path in ce.document_paths([ce.DATA_DIR]):
+        _, ctx, x_elements = ce.check_text(ce.read_text(path))
+        store.ingest(ctx['namespace'], path, x_elements)
+        documents[os.path.basename(path)] = ctx, x_elements
+
+    ctx, _ = documents['package-rev2-reference.json']
+    resolved, missing, conflicts = store.resolve(ctx['index'].referenced)
+    rev1_ctx, rev1 = documents['package-rev1.json']
+    assert rev1_ctx['namespace'] in ctx['index'].referenced
+    assert (missing, conflicts) == ([], [])
+    assert resolved == {e['id']: json.loads(canonical_element(e)) for e in rev1
+                        if e['id'] in resolved}
+    assert len(resolved) == sum(len(ids) for ids in ctx['index'].referenced.values()) == 6
+    store.close()
@@ -0,0 +1,54 @@
+import io
+import json
+import os
+
+from json_stream import JsonStreamReader
+
+DOCUMENT = {
+    'name': 'quote " backslash \\ unicode é中 escapes \n\t\u0001 and 😀',
+    'elements': [
+        {'id': 'a', 'to': [['x', 'y'], [], [[1, 2.5e-3, -10], {'k': [True, False, None]}]]},
+        {'id': 'é\\"', 'n': 1234567890123},
+        [], 'string', 12345,
+    ],
+    'empty': [],
+    'count': 9876543210,
+}
+
+
+def streamed(text: str, array_keys: tuple, chunk_size: int) -> dict:
+    value = {}
+    for k, v in JsonStreamReader(io.StringIO(text), chunk_size).items(array_keys):
+        if k in array_keys:
+            value.setdefault(k, []).append(v)
+        else:
+            value[k] = v
+    return value
+
+
+def test_stream_matches_json_load_across_chunk_boundaries():
+    for text in (json.dumps(DOCUMENT), json.dumps(DOCUMENT, indent=2, ensure_ascii=False)):
+        expected = json.loads(text)
+        for chunk_size in (1, 2, 3, 7, 64, 1 << 16):
+            assert streamed(text, ('elements', 'empty'), chunk_size) == {
+                k: v for k, v in expected.items() if k != 'empty'}      # An empty streamed array yields no items
+
+
+def test_stream_data3_document():
+    path = os.path.join('Data3', 'package-rev2-reference.json')
+    with open(path, encoding='utf8') as fp:
+        expected = json.load(fp)
+    for chunk_size in (1, 5, 100):
+        with open(path, encoding='utf8') as fp:
+            assert streamed(fp.read(), ('elements', 'documentRefs'), chunk_size) == expected
+        with open(path, encoding='utf8') as fp:
+            assert dict(JsonStreamReader(fp, chunk_size).items(())) == expected
+
+
+def test_stream_errors():
+    for text in ('', '[1]', '{"a": 1', '{"a": [1, 2}', '{"a" 1}'):
+        try:
+            list(JsonStreamReader(io.StringIO(text), 2).items(('a',)))
+        except ValueError:
+            continue
+        raise AssertionError(f'no error for {text!r}')
@@ -0,0 +1,13 @@
+import jadn
+from conftest import load_script
+
+
+def test_failed_artifacts_are_reported_and_not_recorded(tmp_path):
+    ma = load_script('make-artifacts')
+    schema = jadn.convert.jidl_load('Schemas/spdx-v3.jidl')
+    good, bad = str(tmp_path / 'spdx-v3.jadn'), str(tmp_path / 'missing' / 'spdx-v3.jadn')
+    manifest = {}
+    failed = ma.build([(jadn.dump, schema, bad, {}, 'stamp'), (jadn.dump, schema, good, {}, 'stamp')], manifest, 2)
+    assert [fname for fname, e in failed] == [bad]
+    assert isinstance(failed[0][1], OSError)
+    assert manifest == {good: 'stamp'}
@@ -0,0 +1,25 @@
+import json
+import os
+
+ACME = 'http://sbom.acme.com/AX7CqA-I/'
+REV2 = 'sha256:0kEfWkpXWZWQCk87lYeAoC1jCrt4g2nFr7ctzYAQqf8/'
+
+
+def test_namespace_clusters(spdx3, tmp_path):
+    ce, schema, codec, plan = spdx3
+    doc = json.loads(ce.read_text(os.path.join(ce.DATA_DIR, 'package-rev2-copy.json')))
+    doc['elements'].append({'id': 'https://other.example.com/sbom/x', 'type': {'file': {}}, 'name': 'x'})
+    doc = codec.decode(ce.DOCUMENT_TYPE, doc)
+    ctx = ce.validate_document(doc, plan)
+    elist = list(ce.DocumentView(ctx, doc['elements']))
+    ids = [ce.prefix_matcher(ctx).compress(e['id']) for e in elist]
+
+    keys = dict(zip(ids, ce.cluster_keys(ctx, elist, ids, 'namespace')))
+    assert keys['foo-contents-rev2'] == REV2
+    assert keys['acme-1493:hello-file'] == ACME
+    assert keys['https://other.example.com/sbom/x'] == ce.EXTERNAL
+    assert set(keys.values()) == {REV2, ACME, ce.EXTERNAL}
+
+    ce.make_dot(ctx, elist, str(tmp_path / 'doc.json'), 'namespace')
+    labels = [line for line in (tmp_path / 'doc.dot').read_text().splitlines() if line.startswith('label=')]
+    assert sorted(labels) == sorted(f'label="{k}"' for k in (REV2, ACME, ce.EXTERNAL))
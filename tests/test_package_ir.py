@@ -0,0 +1,16 @@
+import os
+
+from conftest import FIXTURES
+from template2model import ScanQueue, load_template_from_list_dirs, make_package_ir
+
+
+def test_properties_cross_check_reads_metadata_range(capsys):
+    templates = load_template_from_list_dirs(os.path.join(FIXTURES, 'model'), ScanQueue(verbose=False))
+    template = templates['Core']
+    capsys.readouterr()
+    make_package_ir('Core', template, '')
+    assert capsys.readouterr().out.splitlines() == ['  No Property spdxId']     # name has a matching Range
+
+    template['Properties']['name']['Metadata']['Range'] = 'xsd:anyURI'
+    make_package_ir('Core', template, '')
+    assert "['name', 'xsd:string', '']" in capsys.readouterr().out
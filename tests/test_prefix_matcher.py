@@ -0,0 +1,32 @@
+from element_iri import PrefixMatcher
+
+NAMESPACE = 'http://example.com/spdx/'
+
+
+def test_compress_longest_namespace():
+    matcher = PrefixMatcher(NAMESPACE, {'ex': 'http://example.com/', 'pkg': NAMESPACE + 'pkg/'})
+    assert matcher.compress(NAMESPACE + 'a') == 'a'
+    assert matcher.compress(NAMESPACE + 'pkg/b') == 'pkg:b'
+    assert matcher.compress('http://example.com/other/c') == 'ex:other/c'
+    assert matcher.compress(NAMESPACE) == ''
+
+
+def test_compress_identical_namespace():
+    matcher = PrefixMatcher(NAMESPACE, {'doc': NAMESPACE})
+    assert matcher.compress(NAMESPACE + 'a') == 'a'         # Document namespace takes precedence
+    assert repr(matcher) == 'PrefixMatcher(1 namespaces)'
+
+
+def test_compress_unmatched():
+    matcher = PrefixMatcher(NAMESPACE, {'ex': 'http://example.com/x/'})
+    for iri in ('https://example.com/spdx/a', 'http://example.com/', 'http://example.org/spdx/a', 'a', ''):
+        assert matcher.compress(iri) == iri
+    assert PrefixMatcher().compress(NAMESPACE + 'a') == NAMESPACE + 'a'
+
+
+def test_namespace():
+    matcher = PrefixMatcher(NAMESPACE, {'ex': 'http://example.com/', 'pkg': NAMESPACE + 'pkg/'})
+    assert matcher.namespace(NAMESPACE + 'pkg/b') == NAMESPACE + 'pkg/'
+    assert matcher.namespace(NAMESPACE + 'a') == NAMESPACE
+    assert matcher.namespace('http://example.com/other/c') == 'http://example.com/'
+    assert matcher.namespace('https://example.com/a') == ''
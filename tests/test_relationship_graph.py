@@ -0,0 +1,21 @@
+import os
+
+REVISIONS = ('package-rev1.json', 'package-rev2-copy.json', 'package-rev2-define.json', 'package-rev2-reference.json')
+NAMESPACE = 'sha256:0kEfWkpXWZWQCk87lYeAoC1jCrt4g2nFr7ctzYAQqf8/'
+
+
+def test_same_iri_relationships_with_different_content(spdx3):
+    ce, schema, codec, plan = spdx3
+    ce.init_worker(schema, plan)
+    graph = ce.RelationshipGraph()
+    for f in REVISIONS + REVISIONS:         # Copies of the same relationships are indexed once
+        _, ctx, x_elements = ce.check_text(ce.read_text(os.path.join(ce.DATA_DIR, f)))
+        graph.add(x_elements)
+
+    assert graph.conflicts()[NAMESPACE + 'foo-contents-amend-rev2'] == 3
+    assert sorted(graph.related(NAMESPACE + 'foo-contents-rev2', ce.AMENDS)) == [
+        'acme:foo-contents-rev1',
+        'http://sbom.acme.com/AX7CqA-I/foo-contents-rev1',
+        NAMESPACE + 'foo-contents-rev1',
+    ]
+    assert len(graph.edges[ce.AMENDS][0]) == 3
@@ -0,0 +1,14 @@
+import json
+import os
+
+
+def test_element_without_id_is_reported(spdx3, tmp_path, capsys):
+    ce, schema, codec, plan = spdx3
+    doc = json.loads(ce.read_text(os.path.join(ce.DATA_DIR, 'package-rev1.json')))
+    del doc['elements'][1]['id']
+    (path := tmp_path / 'noid.json').write_text(json.dumps(doc))
+    n, ctx = ce.stream_document(codec, schema, plan, str(path), str(tmp_path / 'noid.jsonl'))
+
+    assert n == len(doc['elements']) - 1
+    assert 'Element 1: Element(Map): missing required field "id"' in capsys.readouterr().out
+    assert len((tmp_path / 'noid.jsonl').read_text().splitlines()) == n
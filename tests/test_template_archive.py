@@ -0,0 +1,29 @@
+import os
+
+from conftest import FIXTURES
+from template2model import ScanQueue, is_archive, load_template_from_archive, load_template_from_list_dirs
+
+MODEL_DIR = os.path.join(FIXTURES, 'model')
+
+
+def load(source: str) -> tuple:
+    queue = ScanQueue(verbose=False)
+    if is_archive(source):
+        return load_template_from_archive(source, queue), queue.diagnostics
+    return load_template_from_list_dirs(source, queue), queue.diagnostics
+
+
+def test_is_archive():
+    assert is_archive('model.tar.gz') and is_archive('model.zip') and is_archive('model.tgz')
+    assert not is_archive(MODEL_DIR)
+
+
+def test_archives_match_directory_scan():
+    templates, diagnostics = load(MODEL_DIR)
+    assert set(templates['Core']) == {'.', 'Classes', 'Properties', 'Vocabularies'}
+    assert templates['Core']['Classes']['Element']['Properties']['spdxId']['minCount'] == '1'
+    for archive in ('model.tar.gz', 'model.zip'):
+        a_templates, a_diagnostics = load(os.path.join(FIXTURES, archive))
+        assert a_templates == templates, archive
+        assert [(d.file, d.code) for d in a_diagnostics] == [(d.file, d.code) for d in diagnostics], archive
+
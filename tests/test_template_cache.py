@@ -0,0 +1,12 @@
+from template2model import ScanQueue, TemplateCache
+
+
+def test_cached_diagnostics_use_scanned_path(tmp_path):
+    doc = '# Other\n\n## Metadata\n\n- name: Mismatch\n'
+    cache = TemplateCache(str(tmp_path))
+    for fpath in ('/a/Core/Classes/Mismatch.md', '/b/Core/Classes/Mismatch.md'):
+        queue = ScanQueue(cache, verbose=False)
+        queue.scan({}, fpath, 'Classes', 'Mismatch', doc=doc)
+        queue.close()
+        assert queue.diagnostics and {d.file for d in queue.diagnostics} == {fpath}
+    assert cache.stats['hits'] == 1
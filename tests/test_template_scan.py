@@ -0,0 +1,53 @@
+import ast
+import os
+import re
+from contextlib import redirect_stdout
+from io import StringIO
+
+from conftest import FIXTURES, load_script
+from template2model import CATEGORY_METADATA, scan_template_file
+
+WARNINGS = {        # (category, name): template with lines that produce each kind of Diagnostic
+    ('Classes', 'Broken'): '\n'.join([
+        'SPDX-License-Identifier: Community-Spec-1.0', '', '# Brokenx', '',
+        '## Summary', '', 'Summary text.', '', '## Description', '', '- not a list in a description', '',
+        '## Metadata', '', '- name: Broken', '* SubclassOf: Element', '',
+        '## Properties', '', '- prop1', '  - type: xsd:string', '  * minCount: 1', '  - malformed entry',
+        '* prop2', '\t- maxCount: 1 ', '',
+        '## External properties restrictions', '', 'unrecognized text', '#not a heading', '']),
+    ('Vocabularies', 'NoEntries'): '# NoEntries\n\n## Metadata\n\n- name: NoEntries\n\nstray text\n',
+    ('Properties', 'Empty'): '',
+    (CATEGORY_METADATA, 'Pkg'): '# Pkg\n\n##  Metadata \n\n- id: https://example.com/Pkg\n',
+}
+
+
+def fixture_templates():
+    root = os.path.join(FIXTURES, 'model', 'Core')
+    yield os.path.join(root, 'Core.md'), CATEGORY_METADATA, 'Core'
+    for category in ('Classes', 'Properties', 'Vocabularies'):
+        for f in sorted(os.listdir(os.path.join(root, category))):
+            yield os.path.join(root, category, f), category, os.path.splitext(f)[0]
+
+
+def normalized(line: str) -> str:
+    """
+    Print missing sections as the single-pass scanner does, sorted names instead of a set
+    """
+    if m := re.match(r'(.* -- Missing required section: )(\{.*\})$', line):
+        return m.group(1) + ', '.join(sorted(ast.literal_eval(m.group(2))))
+    return line
+
+
+def test_single_pass_scanner_matches_regex_cascade():
+    regex_scan = load_script('bench-template-scan').scan_template_file_regex
+    cases = [(path, category, name, open(path, encoding='utf8').read()) for path, category, name in fixture_templates()]
+    cases += [(f'/{c}/{n}.md', c, n, doc) for (c, n), doc in WARNINGS.items()]
+    codes = set()
+    for path, category, name, doc in cases:
+        with redirect_stdout(log := StringIO()):
+            expected = regex_scan(path, doc, category, name)
+        diagnostics = []
+        assert scan_template_file(path, doc, category, name, diagnostics) == expected
+        assert [str(d) for d in diagnostics] == [normalized(line) for line in log.getvalue().splitlines()]
+        codes |= {d.code for d in diagnostics}
+    assert codes == {'heading-mismatch', 'unknown-section', 'bad-data', 'unrecognized-data', 'missing-section'}
@@ -0,0 +1,10 @@
+from transfer_format import FORMATS, document_format, format_path
+
+
+def test_format_path():
+    for source in FORMATS:
+        path = format_path('Out/sbom.json', source)
+        assert document_format(path) == source
+        for fmt in FORMATS:
+            assert format_path(path, fmt) == format_path('Out/sbom.json', fmt)
+    assert format_path('Out/sbom.compact.json', 'verbose') == 'Out/sbom.json'
@@ -0,0 +1,33 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_serve_round_trip(spdx3, tmp_path, capsys):
+    ce, schema, codec, plan = spdx3
+    invalid = tmp_path / 'invalid.json'
+    invalid.write_text('{"elements": 1}')
+    files = ce.document_paths([ce.DATA_DIR]) + [str(invalid)]
+    socket_path = str(tmp_path / 'check.sock')
+
+    async def round_trip(server: ce.ValidationServer) -> None:
+        serving = asyncio.create_task(ce.serve(server, socket_path))
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(.01)
+        await ce.send_documents(socket_path, files)
+        serving.cancel()
+        await serving
+
+    with ThreadPoolExecutor(2, initializer=ce.init_worker, initargs=(schema, plan)) as pool:
+        asyncio.run(round_trip(ce.ValidationServer(pool, concurrency=2)))
+        expected = [ce.check_request(ce.read_text(path)) for path in files]
+    *responses, metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert not os.path.exists(socket_path)
+    assert [(r['status'], r['elements'], r['undefined']) for r in responses] == \
+           [(r['status'], r['elements'], r['undefined']) for r in expected]
+    assert responses[-1]['status'] == 'invalid'
+    assert all(r['timings']['latency'] > 0 for r in responses)
+    assert (metrics['connections'], metrics['requests']) == (1, len(files))
+    assert metrics['valid'] + metrics['invalid'] == len(files)
@@ -0,0 +1,144 @@
+"""
+Schema-driven serializations of documents: verbose, compact and concise JSON, shared by check-elements and spdx-2to3
+
+Run as a script to compare the size and encode/decode speed of each format on scaled Data2 and Data3 samples.
+"""
+import copy
+import gzip
+import jadn
+import json
+import os
+import time
+from schema_cache import SchemaCache
+
+FORMATS = {                     # name: (verbose_rec, verbose_str) of the JADN Codec
+    'verbose': (True, True),    # Records and Maps as objects keyed by field name, Enumerated values by name
+    'compact': (False, True),   # Records as arrays in field id order
+    'concise': (False, False),  # Records as arrays, Maps keyed by field id, Enumerated values by id
+}
+SUFFIXES = {'verbose': '.json', 'compact': '.compact.json', 'concise': '.concise.json'}
+SEPARATORS = (',', ':')
+SAMPLES = {                     # Schema: (document type, sample directory, copies of each sample document)
+    os.path.join('Schemas', 'spdx-v2_2.jidl'): ('Document', 'Data2', 5),
+    os.path.join('Schemas', 'spdx-v3.jidl'): ('TransferUnit', 'Data3', 100),
+}
+
+
+def document_format(path: str) -> str:
+    """
+    Return the format of a document file from its suffix, e.g. "sbom.concise.json" is concise
+    """
+    return next((fmt for fmt, suffix in SUFFIXES.items() if fmt != 'verbose' and path.endswith(suffix)), 'verbose')
+
+
+def format_path(path: str, fmt: str) -> str:
+    """
+    Replace the format suffix of a document path with that of another format, e.g. "sbom.json" to "sbom.concise.json"
+    """
+    return path.removesuffix(SUFFIXES[document_format(path)]) + SUFFIXES[fmt]
+
+
+class FormatCodecs:
+    """
+    Codecs of one schema for each serialization format, each built when it is first used
+    """
+    def __init__(self, schema: dict, verbose: jadn.codec.Codec = None):
+        self.schema = schema
+        self.codecs = {'verbose': verbose} if verbose else {}
+
+    def __getitem__(self, fmt: str) -> jadn.codec.Codec:
+        if fmt not in self.codecs:
+            verbose_rec, verbose_str = FORMATS[fmt]
+            self.codecs[fmt] = jadn.codec.Codec(self.schema, verbose_rec=verbose_rec, verbose_str=verbose_str)
+        return self.codecs[fmt]
+
+    def load(self, datatype: str, path: str) -> dict:
+        """
+        Read and decode a document file in the format given by its suffix
+        """
+        with open(path, encoding='utf8') as fp:
+            return self[document_format(path)].decode(datatype, json.load(fp))
+
+    def dump(self, datatype: str, document: dict, path: str, fmt: str) -> None:
+        """
+        Encode and write a decoded document, verbose documents indented and others without whitespace
+        """
+        with open(path, 'w', encoding='utf8') as fp:
+            json.dump(self[fmt].encode(datatype, document), fp,
+                      **({'indent': 2} if fmt == 'verbose' else {'separators': SEPARATORS}))
+
+
+def record_value(fields: dict, values: dict, fmt: str):
+    """
+    Arrange encoded field values as a Record of a format: an object keyed by name, or an array in field id order
+
+    :param fields: {field name: field definition} of the Record
+    """
+    if FORMATS[fmt][0]:
+        return values
+    record = [None] * max(f[0] for f in fields.values())
+    for k, v in values.items():
+        record[fields[k][0] - 1] = v
+    while record and record[-1] is None:        # Optional fields at the end are omitted, as by the Codec
+        record.pop()
+    return record
+
+
+def scaled_document(document: dict, n_max: int) -> dict:
+    """
+    Return a copy of a verbose document with each array property filled up to n_max items by repeating them
+    """
+    scaled = copy.deepcopy(document)
+    for k, v in scaled.items():
+        if isinstance(v, list) and v:
+            scaled[k] = (v * -(-n_max // len(v)))[:n_max]
+    return scaled
+
+
+def bench(codecs: FormatCodecs, datatype: str, corpus: list) -> None:
+    """
+    Print the size and encode and decode times of each format for a corpus of verbose documents
+
+    Encode is Codec encode + json.dumps, decode is json.loads + Codec decode.
+    """
+    values = [codecs['verbose'].decode(datatype, doc) for doc in corpus]
+    reference = [codecs['verbose'].encode(datatype, v) for v in values]
+    verbose = None
+    for fmt in FORMATS:
+        codec = codecs[fmt]
+        start = time.perf_counter()
+        texts = [json.dumps(codec.encode(datatype, v), separators=SEPARATORS) for v in values]
+        encode = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = [codec.decode(datatype, json.loads(t)) for t in texts]
+        decode = time.perf_counter() - start
+        size = sum(len(t.encode()) for t in texts)
+        verbose = verbose or size
+        lossless = all(codecs['verbose'].encode(datatype, d) == doc for d, doc in zip(decoded, reference))
+        print(f'{fmt:>10}: {size / 1e6:7.2f} MB ({size / verbose:4.0%}), '
+              f'gzip {sum(len(gzip.compress(t.encode(), 6)) for t in texts) / 1e6:6.2f} MB, '
+              f'encode {encode:5.2f} sec, decode {decode:5.2f} sec, round trip to verbose: {"lossless" if lossless else "CHANGED"}')
+
+
+if __name__ == '__main__':
+    print(f'Installed JADN version: {jadn.__version__}\n')
+    cache = SchemaCache()
+    for schema_path, (datatype, sample_dir, copies) in SAMPLES.items():
+        schema = cache.load(schema_path, jadn.convert.jidl_load)['schema']
+        codecs = FormatCodecs(schema)
+        n_max = schema['info'].get('config', {}).get('$MaxElements', jadn.definitions.DEFAULT_CONFIG['$MaxElements'])
+        corpus = []
+        for f in sorted(os.listdir(sample_dir)):
+            if os.path.splitext(f)[1] == '.json':
+                with open(os.path.join(sample_dir, f), encoding='utf8') as fp:
+                    doc = scaled_document(json.load(fp), n_max)
+                try:
+                    codecs['verbose'].decode(datatype, doc)
+                except ValueError as e:
+                    print(f'  {f}: skipped, {e}')
+                    continue
+                corpus += [doc] * copies
+        print(f'{sample_dir}: {len(corpus)} {datatype}s scaled from {len(corpus) // copies} samples, '
+              f'arrays filled up to {n_max} items')
+        bench(codecs, datatype, corpus)
+        print()